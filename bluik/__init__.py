@@ -36,6 +36,10 @@ if "bpy" in locals():
 
     if "dublf" in locals():
         importlib.reload(dublf)
+    if "frame_tables" in locals():
+        importlib.reload(frame_tables)
+    if "scene_scope" in locals():
+        importlib.reload(scene_scope)
     if "preferences" in locals():
         importlib.reload(preferences)
     if "autorig" in locals():
@@ -60,9 +64,19 @@ if "bpy" in locals():
         importlib.reload(oco)
     if "object_selector" in locals():
         importlib.reload(object_selector)
+    if "import_cache" in locals():
+        importlib.reload(import_cache)
+    if "proxies" in locals():
+        importlib.reload(proxies)
+    if "frame_handlers" in locals():
+        importlib.reload(frame_handlers)
+    if "render_bake" in locals():
+        importlib.reload(render_bake)
 
 from . import (
     dublf,
+    frame_tables,
+    scene_scope,
     preferences,
     autorig,
     selection_sets,
@@ -75,10 +89,15 @@ from . import (
     dopesheet_filters,
     oco,
     object_selector,
+    import_cache,
+    proxies,
+    frame_handlers,
+    render_bake,
 )
 
 modules = (
     preferences,
+    scene_scope,
     autorig,
     selection_sets,
     cam_linker,
@@ -90,6 +109,10 @@ modules = (
     oco,
     dopesheet_filters,
     object_selector,
+    import_cache,
+    proxies,
+    frame_handlers,
+    render_bake,
 )
 
 def register():
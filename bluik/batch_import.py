@@ -0,0 +1,305 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# Batch import of OCA and OCO files, each one in its own .blend file,
+# using a pool of background Blender processes.
+#
+# Usage:
+# blender -b --python-expr "import bluik.batch_import as b; b.main()" -- shots/*.oca -o blends -j 8
+#
+# Options of the import operators can be set with --set, e.g. --set shader=EMISSION --set use_atlas=True
+
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import bpy # pylint: disable=import-error
+
+RESULT_PREFIX = "BLUIK_BATCH_RESULT:"
+REPORT_NAME = "bluik_batch_report.json"
+
+# The import operators, by file extension
+IMPORT_OPERATORS = {
+    '.oca': 'import_oca',
+    '.oco': 'import_oco',
+}
+
+def get_script_args( argv=None ):
+    """The arguments after '--' on the Blender command line"""
+    if argv is not None:
+        return argv
+    if '--' in sys.argv:
+        return sys.argv[sys.argv.index('--') + 1:]
+    return []
+
+def parse_options( values ):
+    """Converts a list of 'name=value' strings to a dict of operator options"""
+    options = {}
+    for value in values:
+        name, sep, value = value.partition('=')
+        if sep == "":
+            raise ValueError("Invalid option: " + name + ", the options must be set as name=value")
+        try:
+            options[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            options[name] = value
+    return options
+
+def list_files( patterns ):
+    """Lists the OCA and OCO files matching the paths or glob patterns"""
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if len(matches) == 0 and os.path.isfile(pattern):
+            matches = [pattern]
+        for path in sorted(matches):
+            path = os.path.abspath(path)
+            ext = os.path.splitext(path)[1].lower()
+            if ext in IMPORT_OPERATORS and not path in files:
+                files.append(path)
+    return files
+
+def get_blend_path( path, output_dir, used_paths=None ):
+    """The .blend file where the document is imported.
+    Documents with the same name get a numbered suffix, if their path is already in used_paths"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if output_dir == "":
+        output_dir = os.path.dirname(path)
+    blend_path = os.path.join(output_dir, name + ".blend")
+    if used_paths is None:
+        return blend_path
+    i = 1
+    # file systems may not be case sensitive
+    while os.path.normcase(os.path.abspath(blend_path)) in used_paths:
+        i += 1
+        blend_path = os.path.join(output_dir, name + "_" + str(i) + ".blend")
+    used_paths.add(os.path.normcase(os.path.abspath(blend_path)))
+    return blend_path
+
+# Worker: runs in a background Blender process
+
+def import_file( path, blend_path, options ):
+    """Imports a document in a new empty file and saves it, returns the result of the import"""
+    result = {
+        'file': path,
+        'blend': blend_path,
+        'success': False,
+        'import_time': 0.0,
+        'save_time': 0.0,
+        'error': "",
+    }
+    ext = os.path.splitext(path)[1].lower()
+    op_module = IMPORT_OPERATORS.get(ext)
+    if op_module is None:
+        result['error'] = "Unknown file type: " + ext
+        return result
+
+    bpy.ops.wm.read_homefile(use_empty=True)
+
+    t0 = time.perf_counter()
+    try:
+        # 'import' is a python keyword
+        op = getattr(getattr(bpy.ops, op_module), 'import')
+        op_result = op(
+            filepath=path,
+            filename=os.path.basename(path),
+            directory=os.path.dirname(path),
+            **options
+            )
+    except Exception as e: # pylint: disable=broad-except
+        # Report any failure of the import instead of crashing the worker
+        result['error'] = str(e)
+        result['import_time'] = time.perf_counter() - t0
+        return result
+    result['import_time'] = time.perf_counter() - t0
+    if not 'FINISHED' in op_result:
+        result['error'] = "The import was cancelled"
+        return result
+
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(blend_path), exist_ok=True)
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path)
+    result['save_time'] = time.perf_counter() - t0
+    result['success'] = True
+    return result
+
+def run_worker( args ):
+    options = parse_options(args.set)
+    result = import_file(args.files[0], args.output, options)
+    print(RESULT_PREFIX + json.dumps(result))
+    sys.stdout.flush()
+
+# Pool: launches the workers
+
+def get_worker_command( blender, path, blend_path, options ):
+    """The command line running a worker for the document"""
+    package = __package__
+    expr = "; ".join((
+        "import addon_utils",
+        "addon_utils.check({0!r})[1] or addon_utils.enable({0!r}, default_set=False)".format(package),
+        "import {}.batch_import as b".format(package),
+        "b.main()",
+        ))
+    command = [blender, '-b', '--python-expr', expr, '--', '--worker', path, '-o', blend_path]
+    for name, value in options.items():
+        command += ['--set', name + '=' + repr(value)]
+    return command
+
+def run_file( blender, path, blend_path, options, timeout, log_path ):
+    """Runs a worker process for the document, returns the result with the total time"""
+    t0 = time.perf_counter()
+    result = {
+        'file': path,
+        'blend': blend_path,
+        'success': False,
+        'import_time': 0.0,
+        'save_time': 0.0,
+        'error': "",
+    }
+    command = get_worker_command(blender, path, blend_path, options)
+    try:
+        process = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            timeout=timeout
+            )
+        output = process.stdout
+        result['error'] = "Blender exited with code {}".format(process.returncode)
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout or ""
+        if isinstance(output, bytes):
+            output = output.decode(errors='replace')
+        result['error'] = "Timed out after {} s".format(timeout)
+    except OSError as e:
+        output = ""
+        result['error'] = str(e)
+
+    for line in output.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            result.update( json.loads(line[len(RESULT_PREFIX):]) )
+
+    if log_path != "":
+        with open(log_path, 'w') as log_file:
+            log_file.write(output)
+        result['log'] = log_path
+
+    result['total_time'] = time.perf_counter() - t0
+    return result
+
+def run_batch( files, output_dir="", workers=4, options=None, blender="", timeout=None, report_path="" ):
+    """Imports all the files using a pool of background Blender processes,
+    writes a JSON report and returns the results"""
+    if options is None:
+        options = {}
+    if blender == "":
+        blender = bpy.app.binary_path
+    if output_dir != "":
+        os.makedirs(output_dir, exist_ok=True)
+    if report_path == "":
+        report_dir = output_dir
+        if report_dir == "":
+            report_dir = os.getcwd()
+        report_path = os.path.join(report_dir, REPORT_NAME)
+
+    t0 = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = []
+        used_paths = set()
+        for path in files:
+            blend_path = get_blend_path(path, output_dir, used_paths)
+            log_path = os.path.splitext(blend_path)[0] + ".log"
+            futures.append( pool.submit(run_file, blender, path, blend_path, options, timeout, log_path) )
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "OK" if result['success'] else "FAILED (" + result['error'] + ")"
+            print("Bluik: [{}/{}] {} - {:.2f} s - {}".format(
+                len(results),
+                len(files),
+                os.path.basename(result['file']),
+                result['total_time'],
+                status
+                ))
+    total_time = time.perf_counter() - t0
+
+    results.sort(key=lambda r: r['file'])
+    succeeded = [r for r in results if r['success']]
+    report = {
+        'files': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'workers': workers,
+        'total_time': total_time,
+        'import_time': sum(r['import_time'] for r in results),
+        'results': results,
+    }
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=4)
+
+    print("Bluik: imported {} of {} files in {:.2f} s with {} workers. Report: {}".format(
+        report['succeeded'],
+        report['files'],
+        total_time,
+        workers,
+        report_path
+        ))
+    return results
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser(
+        prog="bluik.batch_import",
+        description="Imports OCA and OCO files in .blend files using background Blender processes"
+        )
+    parser.add_argument('files', nargs='+', help="The OCA/OCO files or glob patterns")
+    parser.add_argument('-o', '--output', default="", help="The folder for the .blend files (next to the documents by default)")
+    parser.add_argument('-j', '--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="The number of Blender processes")
+    parser.add_argument('--set', action='append', default=[], metavar="NAME=VALUE", help="An option of the import operator")
+    parser.add_argument('--blender', default="", help="The Blender executable (the current one by default)")
+    parser.add_argument('--timeout', type=float, default=None, help="The maximum time for each file, in seconds")
+    parser.add_argument('--report', default="", help="The JSON report file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(get_script_args(argv))
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    files = list_files(args.files)
+    if len(files) == 0:
+        print("Bluik: no OCA or OCO file found")
+        return
+    results = run_batch(
+        files,
+        args.output,
+        args.workers,
+        parse_options(args.set),
+        args.blender,
+        args.timeout,
+        args.report
+        )
+    if bpy.app.background and any(not r['success'] for r in results):
+        sys.exit(1)
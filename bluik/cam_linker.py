@@ -21,8 +21,109 @@
 
 import bpy # pylint: disable=import-error
 import idprop # pylint: disable=import-error
+import re
+from bisect import bisect_right
 from bpy.app.handlers import persistent # pylint: disable=import-error
 from . import dublf
+from . import scene_scope
+
+# The objects with camera linkers
+# { object pointer: object }
+cam_linker_objects = {}
+# Set when the index has to be rebuilt from bpy.data (load, undo)
+cam_linker_objects_dirty = True
+# The parsed targets of the camera linkers
+# { linker pointer: (target rna, path to the struct, attribute name) }
+cam_linker_targets = {}
+# Splits an RNA path between the path to the struct and the attribute
+RNA_ATTRIBUTE_RE = re.compile(r'^(?:(.*)\.)?([A-Za-z_]\w*)$')
+
+def register_cam_linker_object( obj ):
+    """Adds (or removes) the object to the index, after its camera linkers have changed"""
+    if len(obj.cam_linkers) > 0:
+        cam_linker_objects[obj.as_pointer()] = obj
+    else:
+        cam_linker_objects.pop(obj.as_pointer(), None)
+
+def get_cam_linker_objects( scene=None ):
+    """Returns all the objects with camera linkers,
+    or only the ones in the scene"""
+    global cam_linker_objects_dirty
+    if cam_linker_objects_dirty:
+        cam_linker_objects.clear()
+        cam_linker_targets.clear()
+        for obj in bpy.data.objects:
+            register_cam_linker_object(obj)
+        cam_linker_objects_dirty = False
+    scope = None
+    if scene is not None:
+        scope = scene_scope.get_scene_scope(scene)
+    objects = []
+    for key, obj in tuple(cam_linker_objects.items()):
+        if scope is not None and not key in scope.objects:
+            continue
+        try:
+            if len(obj.cam_linkers) == 0:
+                del cam_linker_objects[key]
+                continue
+        except ReferenceError:
+            # The object has been removed
+            del cam_linker_objects[key]
+            continue
+        objects.append(obj)
+    return objects
+
+def get_cam_linker_target( obj, cam_linker ):
+    """Returns the (struct, attribute name) pointed by the linker.
+    The RNA path is parsed once, then resolved by Blender"""
+    rna = cam_linker.target_rna
+    if rna == '':
+        return None
+    key = cam_linker.as_pointer()
+    cached = cam_linker_targets.get(key)
+    if cached is None or cached[0] != rna:
+        match = RNA_ATTRIBUTE_RE.match(rna)
+        if match is None:
+            return dublf.rna.get_bpy_struct(obj, rna)
+        cached = (rna, match.group(1), match.group(2))
+        cam_linker_targets[key] = cached
+    path = cached[1]
+    if path is None:
+        return (obj, cached[2])
+    try:
+        struct = obj.path_resolve(path)
+    except ValueError:
+        return None
+    return (struct, cached[2])
+
+def invalidate_cam_linker_targets( obj ):
+    """Forces the targets of the linkers of the object to be parsed again"""
+    for cam_linker in obj.cam_linkers:
+        cam_linker_targets.pop(cam_linker.as_pointer(), None)
+
+def update_target_rna( cam_linker, context ):
+    cam_linker_targets.pop(cam_linker.as_pointer(), None)
+
+@persistent
+def cam_linker_dirty_handler( *args ):
+    """Flags the index to be rebuilt, after loading a file or undoing"""
+    global cam_linker_objects_dirty
+    cam_linker_objects_dirty = True
+    camera_cuts.clear()
+
+@persistent
+def cam_linker_depsgraph_handler( scene, depsgraph ):
+    """Registers new objects (duplicated, appended...) with camera linkers"""
+    if cam_linker_objects_dirty:
+        return
+    for update in depsgraph.updates:
+        obj = update.id.original
+        if not isinstance(obj, bpy.types.Object):
+            continue
+        if obj.as_pointer() in cam_linker_objects:
+            continue
+        if len(obj.cam_linkers) > 0:
+            register_cam_linker_object(obj)
 
 class DUIK_CamLinker( bpy.types.PropertyGroup ):
     """A control to link the scene camera to specific properties"""
@@ -69,7 +170,8 @@ class DUIK_CamLinker( bpy.types.PropertyGroup ):
             description = "Type of ID-Block that can be used",
             default= 'objects'
         )
-    target_rna: bpy.props.StringProperty( name = "RNA", description = "The RNA to the property from the ID-Block" )
+    target_rna: bpy.props.StringProperty( name = "RNA", description = "The RNA to the property from the ID-Block", update=update_target_rna )
+    baked: bpy.props.BoolProperty( default=False )
 
 class DUIK_OT_new_cam_linker( bpy.types.Operator ):
     """Creates a new Cam Linker"""
@@ -83,6 +185,7 @@ class DUIK_OT_new_cam_linker( bpy.types.Operator ):
 
         cam_linker = cam_linkers.add()
         cam_linker.name = "Camera Linker"
+        register_cam_linker_object(obj)
 
         return {'FINISHED'}
 
@@ -102,6 +205,9 @@ class DUIK_OT_duplicate_cam_linker( bpy.types.Operator ):
         cam_linker.target_rna = cam_linker_from.target_rna
 
         cam_linkers.move(len(cam_linkers) -1, obj.active_cam_linker+1)
+        # the linkers have moved
+        invalidate_cam_linker_targets(obj)
+        register_cam_linker_object(obj)
 
         return {'FINISHED'}
 
@@ -112,9 +218,12 @@ class DUIK_OT_remove_ui_control( bpy.types.Operator ):
     bl_options = {'REGISTER','UNDO'}
 
     def execute(self, context):
-        cam_linkers = context.active_object.cam_linkers
-        active_cam_linker = context.active_object.active_cam_linker
+        obj = context.active_object
+        cam_linkers = obj.cam_linkers
+        active_cam_linker = obj.active_cam_linker
+        invalidate_cam_linker_targets(obj)
         cam_linkers.remove(active_cam_linker)
+        register_cam_linker_object(obj)
 
         return {'FINISHED'}
 
@@ -176,24 +285,156 @@ class DUIK_PT_cam_linker( bpy.types.Panel ):
             row = layout.row()
             layout.prop( active, "target_rna", text = "Path" , icon='RNA')
 
-@persistent
+        layout.prop( context.scene, "duik_cam_linker_use_markers" )
+
+# Camera cuts: the cameras bound to the timeline markers
+
+# { scene pointer: (sorted list of frames, list of cameras) }
+camera_cuts = {}
+
+def get_camera_cuts( scene ):
+    """Returns the frames and cameras of the camera markers of the scene, sorted by frame"""
+    key = scene.as_pointer()
+    cuts = camera_cuts.get(key)
+    if cuts is None:
+        markers = [(m.frame, m.camera) for m in scene.timeline_markers if m.camera is not None]
+        markers.sort(key=lambda m: m[0])
+        cuts = ([m[0] for m in markers], [m[1] for m in markers])
+        camera_cuts[key] = cuts
+    return cuts
+
+def get_marker_camera( scene, frame ):
+    """Returns the camera bound to the markers at the given frame, like Blender does,
+    without depending on the previous frames. None if there's no camera marker"""
+    frames, cameras = get_camera_cuts(scene)
+    if len(frames) == 0:
+        return None
+    # before the first marker, the first camera is used
+    i = max(bisect_right(frames, frame) - 1, 0)
+    try:
+        cameras[i].name
+    except ReferenceError:
+        # the camera has been removed
+        camera_cuts.pop(scene.as_pointer(), None)
+        return get_marker_camera(scene, frame)
+    return cameras[i]
+
+def link_camera( scene, camera ):
+    """Sets the camera to all the camera linkers of the scene"""
+    for obj in get_cam_linker_objects(scene):
+        for cam_linker in obj.cam_linkers:
+            if cam_linker.baked:
+                continue
+            struct = get_cam_linker_target(obj, cam_linker)
+            if not (struct is None):
+                #bpy.context.object.pose.bones["pupil"].constraints["Track To"].target = scene.camera
+                setattr(struct[0], struct[1], camera)
+
 def update_camera_links( scene ):
     """Updates all properties pointing to the current camera"""
+    camera = scene.camera
+    if scene.duik_cam_linker_use_markers:
+        marker_camera = get_marker_camera(scene, scene.frame_current)
+        if marker_camera is not None:
+            camera = marker_camera
     # Check if the cam has changed, to avoid unnecessary overweight
-    if scene.camera is None:
+    if camera is None:
         DUIK_CamLinker.current_cam = ""
         return
-    if scene.camera.name == DUIK_CamLinker.current_cam:
+    if camera.name == DUIK_CamLinker.current_cam:
         return
-    DUIK_CamLinker.current_cam = scene.camera.name
-    # get all camera linkers in the scene
-    for obj in scene.collection.all_objects:
-        for cam_linker in obj.cam_linkers:
-            if (cam_linker.target_rna != ''):
-                struct = dublf.rna.get_bpy_struct(obj, cam_linker.target_rna)
-                if not (struct is None):
-                    #bpy.context.object.pose.bones["pupil"].constraints["Track To"].target = scene.camera
-                    setattr(struct[0], struct[1], scene.camera)
+    DUIK_CamLinker.current_cam = camera.name
+    link_camera(scene, camera)
+
+# Bake: one copy of the constraint per camera, with keyed influences
+
+BAKED_SUFFIX = " (Bluik: "
+
+def get_baked_constraint_name( constraint, camera ):
+    return constraint.name + BAKED_SUFFIX + camera.name + ")"
+
+def copy_constraint( constraints, source ):
+    """Creates a copy of the constraint in the same stack"""
+    constraint = constraints.new(source.type)
+    for prop in source.bl_rna.properties:
+        if prop.is_readonly or prop.identifier in ('name', 'type', 'rna_type'):
+            continue
+        try:
+            setattr(constraint, prop.identifier, getattr(source, prop.identifier))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return constraint
+
+def key_influence( constraint, frame, value ):
+    constraint.influence = value
+    constraint.keyframe_insert('influence', frame=frame)
+
+def bake_cam_linker( obj, cam_linker, scene ):
+    """Replaces the camera switch of a linker targetting a constraint
+    by one constraint per camera with keyed influences.
+    Returns False if the linker can't be baked"""
+    struct = get_cam_linker_target(obj, cam_linker)
+    if struct is None or struct[1] != 'target' or not isinstance(struct[0], bpy.types.Constraint):
+        return False
+    frames, cameras = get_camera_cuts(scene)
+    if len(frames) == 0:
+        return False
+    constraint = struct[0]
+    constraints = constraint.id_data.path_resolve( constraint.path_from_id().rsplit('[', 1)[0] )
+
+    # one constraint per camera, the original one for the first camera
+    camera_constraints = {}
+    for camera in cameras:
+        if camera.name in camera_constraints:
+            continue
+        if len(camera_constraints) == 0:
+            c = constraint
+        else:
+            c = copy_constraint(constraints, constraint)
+            c.name = get_baked_constraint_name(constraint, camera)
+        c.target = camera
+        camera_constraints[camera.name] = c
+
+    for frame, camera in zip(frames, cameras):
+        for name, c in camera_constraints.items():
+            key_influence(c, frame, 1.0 if name == camera.name else 0.0)
+
+    # constant interpolation
+    anim_data = obj.animation_data
+    for c in camera_constraints.values():
+        curve = anim_data.action.fcurves.find( c.path_from_id('influence') )
+        if curve is None:
+            continue
+        for key in curve.keyframe_points:
+            key.interpolation = 'CONSTANT'
+
+    cam_linker.baked = True
+    return True
+
+def unbake_cam_linker( obj, cam_linker ):
+    """Removes the constraints and keys created by the bake"""
+    cam_linker.baked = False
+    struct = get_cam_linker_target(obj, cam_linker)
+    if struct is None or not isinstance(struct[0], bpy.types.Constraint):
+        return
+    constraint = struct[0]
+    constraints = constraint.id_data.path_resolve( constraint.path_from_id().rsplit('[', 1)[0] )
+    prefix = constraint.name + BAKED_SUFFIX
+    for c in [c for c in constraints if c.name.startswith(prefix)]:
+        dublf.animation.remove_all_keyframes(obj, c.path_from_id('influence'))
+        constraints.remove(c)
+    dublf.animation.remove_all_keyframes(obj, constraint.path_from_id('influence'))
+    constraint.influence = 1.0
+    # Force relinking
+    DUIK_CamLinker.current_cam = ""
+
+@persistent
+def camera_cuts_depsgraph_handler( scene, depsgraph ):
+    """Markers may have changed"""
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Scene):
+            camera_cuts.clear()
+            return
 
 classes = (
     DUIK_CamLinker,
@@ -215,9 +456,21 @@ def register():
         bpy.types.Object.cam_linkers = bpy.props.CollectionProperty( type = DUIK_CamLinker )
     if not hasattr( bpy.types.Object, 'active_cam_linker' ):
         bpy.types.Object.active_cam_linker = bpy.props.IntProperty()
-
-    # Add handler
-    dublf.handlers.frame_change_post_append( update_camera_links )
+    if not hasattr( bpy.types.Scene, 'duik_cam_linker_use_markers' ):
+        bpy.types.Scene.duik_cam_linker_use_markers = bpy.props.BoolProperty(
+            name="Use camera markers",
+            description="Links the cameras bound to the timeline markers at cuts, instead of following the active camera; works when rendering frames in any order",
+            default=False
+            )
+
+    # Add handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if not cam_linker_dirty_handler in handlers:
+            handlers.append(cam_linker_dirty_handler)
+    if not cam_linker_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(cam_linker_depsgraph_handler)
+    if not camera_cuts_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(camera_cuts_depsgraph_handler)
 
 def unregister():
     # unregister
@@ -226,6 +479,16 @@ def unregister():
     
     del bpy.types.Object.cam_linkers
     del bpy.types.Object.active_cam_linker
-
-    # Remove handler
-    dublf.handlers.frame_change_post_remove( update_camera_links )
\ No newline at end of file
+    del bpy.types.Scene.duik_cam_linker_use_markers
+
+    # Remove handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if cam_linker_dirty_handler in handlers:
+            handlers.remove(cam_linker_dirty_handler)
+    if cam_linker_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(cam_linker_depsgraph_handler)
+    if camera_cuts_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(camera_cuts_depsgraph_handler)
+    camera_cuts.clear()
+    cam_linker_objects.clear()
+    cam_linker_targets.clear()
\ No newline at end of file
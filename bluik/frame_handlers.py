@@ -0,0 +1,218 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# The single frame change handler of Bluik,
+# which calls the hooks of all the features and measures the time they use
+
+import os
+import time
+from collections import deque
+import bpy # pylint: disable=import-error
+from bpy.app.handlers import persistent # pylint: disable=import-error
+from . import dublf
+from . import tex_anim
+from . import object_selector
+from . import cam_linker
+from . import preferences
+
+# The hooks, called in this order on each frame change
+hooks = (
+    ("Camera Linkers", cam_linker.update_camera_links),
+    ("TexAnims", tex_anim.update_image_handler),
+    ("Object Selectors", object_selector.update_object_handler),
+)
+
+TOTAL = "Total"
+
+# Set to evaluate frames without running the hooks, e.g. to time them separately
+hooks_suspended = False
+
+class HookTimings():
+    """Rolling timings of a hook, in seconds"""
+
+    def __init__(self, num_samples):
+        self.samples = deque(maxlen=num_samples)
+        self.count = 0
+
+    def add(self, duration):
+        self.samples.append(duration)
+        self.count += 1
+
+    def get_min(self):
+        if len(self.samples) == 0:
+            return 0.0
+        return min(self.samples)
+
+    def get_mean(self):
+        if len(self.samples) == 0:
+            return 0.0
+        return sum(self.samples) / len(self.samples)
+
+    def get_p95(self):
+        if len(self.samples) == 0:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[ min( int(len(samples) * 0.95), len(samples) - 1 ) ]
+
+# { hook_name: HookTimings }
+hook_timings = {}
+
+# The CSV file where the timings are written
+timings_csv_file = None
+timings_csv_path = ""
+
+def get_hook_timings( name, num_samples ):
+    """Gets (or creates) the timings of a hook"""
+    timings = hook_timings.get(name)
+    if timings is None or timings.samples.maxlen != num_samples:
+        timings = HookTimings(num_samples)
+        hook_timings[name] = timings
+    return timings
+
+def reset_timings():
+    hook_timings.clear()
+
+def get_timings_csv( path ):
+    """Opens the CSV file where the timings are written, writes the header if it's a new file"""
+    global timings_csv_file
+    global timings_csv_path
+    if timings_csv_file is not None and timings_csv_path == path:
+        return timings_csv_file
+    close_timings_csv()
+    is_new = not os.path.isfile(path)
+    try:
+        timings_csv_file = open(path, 'a')
+    except OSError as e:
+        print("Bluik: can't write the handler timings to " + path + ": " + str(e))
+        timings_csv_file = None
+        return None
+    timings_csv_path = path
+    if is_new:
+        header = ["Scene", "Frame"]
+        for name, hook in hooks:
+            header.append(name + " (ms)")
+        header.append(TOTAL + " (ms)")
+        timings_csv_file.write(",".join(header) + "\n")
+    return timings_csv_file
+
+def close_timings_csv():
+    global timings_csv_file
+    global timings_csv_path
+    if timings_csv_file is not None:
+        timings_csv_file.close()
+    timings_csv_file = None
+    timings_csv_path = ""
+
+def call_hooks( scene ):
+    """Calls all the hooks without measuring them"""
+    for name, hook in hooks:
+        hook(scene)
+
+@persistent
+def frame_change_handler( scene ):
+    """Calls the hooks of all the features, and records their timings if enabled"""
+    if hooks_suspended:
+        return
+    prefs = preferences.get_preferences()
+    if not prefs.handler_timings_enabled:
+        close_timings_csv()
+        call_hooks(scene)
+        return
+
+    num_samples = prefs.handler_timings_samples
+    durations = []
+    t_start = time.perf_counter()
+    t0 = t_start
+    for name, hook in hooks:
+        hook(scene)
+        t1 = time.perf_counter()
+        get_hook_timings(name, num_samples).add(t1 - t0)
+        durations.append(t1 - t0)
+        t0 = t1
+    total = t0 - t_start
+    get_hook_timings(TOTAL, num_samples).add(total)
+
+    csv_path = prefs.handler_timings_csv
+    if csv_path == "":
+        close_timings_csv()
+        return
+    csv_file = get_timings_csv(bpy.path.abspath(csv_path))
+    if csv_file is None:
+        return
+    row = [ '"' + scene.name.replace('"', '""') + '"', str(scene.frame_current) ]
+    for duration in durations:
+        row.append( "{:.4f}".format(duration * 1000) )
+    row.append( "{:.4f}".format(total * 1000) )
+    csv_file.write(",".join(row) + "\n")
+    # the file stays open during the session, keep it readable
+    csv_file.flush()
+
+def draw_timings( layout ):
+    """Draws the timings table in the layout"""
+    if len(hook_timings) == 0:
+        layout.label(text="No timings recorded yet. Play the animation to measure the handlers.")
+        return
+    col = layout.column(align=True)
+    row = col.row()
+    row.label(text="Hook")
+    row.label(text="Min (ms)")
+    row.label(text="Mean (ms)")
+    row.label(text="P95 (ms)")
+    row.label(text="Frames")
+    names = [name for name, hook in hooks]
+    names.append(TOTAL)
+    for name in names:
+        timings = hook_timings.get(name)
+        if timings is None:
+            continue
+        row = col.row()
+        row.label(text=name)
+        row.label(text="{:.3f}".format(timings.get_min() * 1000))
+        row.label(text="{:.3f}".format(timings.get_mean() * 1000))
+        row.label(text="{:.3f}".format(timings.get_p95() * 1000))
+        row.label(text=str(timings.count))
+
+class BLUIK_OT_reset_handler_timings( bpy.types.Operator ):
+    """Resets the timings of the frame change handlers"""
+    bl_idname = "bluik.reset_handler_timings"
+    bl_label = "Reset timings"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        reset_timings()
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
+classes = (
+    BLUIK_OT_reset_handler_timings,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    dublf.handlers.frame_change_post_append( frame_change_handler )
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+
+    dublf.handlers.frame_change_post_remove( frame_change_handler )
+    close_timings_csv()
+    reset_timings()
@@ -0,0 +1,100 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# Compiles constant F-Curves to frame -> value tables,
+# to get animated indices without evaluating the curves
+
+from array import array
+from math import ceil
+import bpy # pylint: disable=import-error
+
+def compile_fcurve( curve, min_value=None, max_value=None, typecode='H' ):
+    """Compiles a curve with only constant keys to a table of integer values, one per frame.
+    Returns a tuple (first frame, array of values),
+    or None if the curve is not a simple constant curve"""
+    if curve is None or curve.mute or len(curve.modifiers) > 0:
+        return None
+    if curve.extrapolation != 'CONSTANT':
+        return None
+    keys = curve.keyframe_points
+    numKeys = len(keys)
+    if numKeys == 0:
+        return None
+    for key in keys:
+        if key.interpolation != 'CONSTANT':
+            return None
+    co = [0.0] * (numKeys * 2)
+    keys.foreach_get('co', co)
+
+    # a constant key at a subframe applies from the next integer frame
+    frames = [ceil(f) for f in co[0::2]]
+    values = [int(v) for v in co[1::2]]
+    if min_value is not None:
+        values = [max(v, min_value) for v in values]
+    if max_value is not None:
+        values = [min(v, max_value) for v in values]
+    start = frames[0]
+    end = frames[-1]
+    table = array(typecode, [values[0]]) * (end - start + 1)
+    for i in range(numKeys):
+        f = frames[i] - start
+        if i < numKeys - 1:
+            next_f = frames[i+1] - start
+        else:
+            next_f = end - start + 1
+        if next_f > f:
+            table[f:next_f] = array(typecode, [values[i]]) * (next_f - f)
+    return (start, table)
+
+def lookup( table, frame ):
+    """Gets the value at the given frame, holding the first and last values"""
+    start, values = table
+    i = frame - start
+    if i < 0:
+        i = 0
+    elif i >= len(values):
+        i = len(values) - 1
+    return values[i]
+
+# Invalidation: the tables are stored with the pointer of the action they were compiled from,
+# { key: (action pointer, table) }
+
+def get_action_key( id_data ):
+    """The pointer of the action animating the ID, 0 if there is none.
+    NLA tracks change the evaluated values: 0 too, the curves can't be compiled"""
+    anim_data = id_data.animation_data
+    if anim_data is None or anim_data.action is None or len(anim_data.nla_tracks) > 0:
+        return 0
+    return anim_data.action.as_pointer()
+
+def get_updated_actions( depsgraph ):
+    """The pointers of the actions updated in the depsgraph"""
+    actions = set()
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Action):
+            actions.add(update.id.original.as_pointer())
+    return actions
+
+def remove_action_tables( tables, actions ):
+    """Removes the tables compiled from the given actions"""
+    if len(actions) == 0:
+        return
+    for key, entry in tuple(tables.items()):
+        if entry[0] in actions:
+            del tables[key]
@@ -0,0 +1,298 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# A persistent cache for the OCA and OCO imports:
+# the content hashes of the frame files (keyed by path, mtime and size)
+# and the cut-out meshes traced from the drawings (keyed by content hash and tracing settings).
+# The decoded pixels are not cached: Blender images can only load files,
+# filling them from cached pixels would be slower than decoding the PNG files
+
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+import bpy # pylint: disable=import-error
+from . import dublf
+from . import preferences
+
+CACHE_VERSION = 1
+INDEX_NAME = "files.json"
+MESH_FOLDER = "meshes"
+MAX_INDEX_ENTRIES = 200000
+
+# The folder of the opened cache, None if the cache is disabled or not opened
+cache_root = None
+# { path: [mtime, size, last used, info] }
+file_index = {}
+file_index_modified = False
+file_index_lock = threading.Lock()
+cache_stats = {
+    'hits': 0,
+    'misses': 0,
+}
+
+def get_cache_dir():
+    """The folder of the cache, from the preferences"""
+    prefs = preferences.get_preferences()
+    if prefs.import_cache_dir != "":
+        return bpy.path.abspath(prefs.import_cache_dir)
+    return os.path.join(bpy.utils.user_resource('DATAFILES'), "bluik", "import_cache")
+
+def read_index( root ):
+    """Reads the file index of the cache folder, returns an empty index if it's missing or invalid"""
+    index_path = os.path.join(root, INDEX_NAME)
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+        if index.get('version') == CACHE_VERSION:
+            return index['files']
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError):
+        print("Bluik: the import cache index is invalid, it will be reset")
+    return {}
+
+def merge_index( index, other ):
+    """Adds the entries of the other index, keeping the most recent entry of each file"""
+    for path, entry in other.items():
+        current = index.get(path)
+        if current is None or (entry[0], entry[2]) > (current[0], current[2]):
+            index[path] = entry
+
+def open_cache():
+    """Opens the cache before an import, must be called from the main thread.
+    Returns False if the cache is disabled"""
+    global cache_root
+    global file_index
+    global file_index_modified
+    cache_stats['hits'] = 0
+    cache_stats['misses'] = 0
+    if not preferences.get_preferences().import_cache_enabled:
+        cache_root = None
+        return False
+    cache_root = get_cache_dir()
+    os.makedirs(os.path.join(cache_root, MESH_FOLDER), exist_ok=True)
+    file_index = read_index(cache_root)
+    file_index_modified = False
+    return True
+
+def close_cache():
+    """Writes the index and frees space after an import, must be called from the main thread"""
+    global cache_root
+    global file_index
+    if cache_root is None:
+        return
+    if file_index_modified:
+        # other Blender instances (batch workers) may have written the index since it was read
+        merge_index(file_index, read_index(cache_root))
+        if len(file_index) > MAX_INDEX_ENTRIES:
+            # keep the most recently used entries
+            paths = sorted(file_index, key=lambda p: file_index[p][2], reverse=True)
+            file_index = { p: file_index[p] for p in paths[:MAX_INDEX_ENTRIES] }
+        # write a temp file first: other Blender instances may read the index
+        index_path = os.path.join(cache_root, INDEX_NAME)
+        temp_path = index_path + "." + str(os.getpid())
+        with open(temp_path, 'w') as index_file:
+            json.dump({'version': CACHE_VERSION, 'files': file_index}, index_file)
+        os.replace(temp_path, index_path)
+    cleanup_cache(cache_root, preferences.get_preferences().import_cache_size * 1048576)
+    print("Bluik: import cache, {} hits, {} misses".format(cache_stats['hits'], cache_stats['misses']))
+    cache_root = None
+    file_index = {}
+
+def cleanup_cache( root, max_size ):
+    """Removes the least recently used files until the cache is smaller than max_size, in bytes.
+    Other Blender instances may replace or remove files at the same time"""
+    files = []
+    total_size = 0
+    for folder, dirs, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            total_size += stat.st_size
+            if name.startswith(INDEX_NAME) and folder == root:
+                continue
+            files.append( (stat.st_mtime, stat.st_size, path) )
+    if total_size <= max_size:
+        return
+    files.sort()
+    for modified, size, path in files:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+        if total_size <= max_size:
+            break
+
+def clear_cache():
+    """Removes all the files of the cache"""
+    root = get_cache_dir()
+    if os.path.isdir(root):
+        cleanup_cache(root, -1)
+        try:
+            os.remove(os.path.join(root, INDEX_NAME))
+        except FileNotFoundError:
+            pass
+
+# Files
+
+def get_file_info( path ):
+    """Gets the info stored for the file if it has not changed since, or None.
+    Can be called from any thread"""
+    if cache_root is None:
+        return None
+    stat = os.stat(path)
+    with file_index_lock:
+        entry = file_index.get(path)
+        if entry is None or entry[0] != stat.st_mtime or entry[1] != stat.st_size:
+            cache_stats['misses'] += 1
+            return None
+        entry[2] = time.time()
+        cache_stats['hits'] += 1
+        return entry[3]
+
+def set_file_info( path, info ):
+    """Stores info about the file (a JSON compatible value).
+    Can be called from any thread"""
+    global file_index_modified
+    if cache_root is None:
+        return
+    stat = os.stat(path)
+    with file_index_lock:
+        file_index[path] = [stat.st_mtime, stat.st_size, time.time(), info]
+        file_index_modified = True
+
+# Cut-out meshes
+
+def get_mesh_key( content_hash, *settings ):
+    """The key of a mesh traced from a drawing with the given settings"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(content_hash.encode())
+    h.update(json.dumps((CACHE_VERSION,) + settings).encode())
+    return h.hexdigest()
+
+def get_mesh_path( key ):
+    return os.path.join(cache_root, MESH_FOLDER, key + ".npz")
+
+def load_mesh( key ):
+    """Loads the arrays of a cached mesh, or None"""
+    if cache_root is None:
+        return None
+    path = get_mesh_path(key)
+    if not os.path.isfile(path):
+        cache_stats['misses'] += 1
+        return None
+    try:
+        with np.load(path) as data:
+            arrays = { name: data[name] for name in data.files }
+    except (OSError, ValueError):
+        cache_stats['misses'] += 1
+        return None
+    # mark it as recently used
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # evicted by another Blender instance
+        pass
+    cache_stats['hits'] += 1
+    return arrays
+
+def save_mesh( key, arrays ):
+    if cache_root is None:
+        return
+    path = get_mesh_path(key)
+    temp_path = path + "." + str(os.getpid()) + ".npz"
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+def get_mesh_arrays( obj ):
+    """Gets the geometry, uvs and location of a mesh object as arrays"""
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+    uv = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    if mesh.uv_layers.active is not None:
+        mesh.uv_layers.active.data.foreach_get('uv', uv)
+    else:
+        uv.fill(0.0)
+    return {
+        'co': co,
+        'loop_totals': loop_totals,
+        'loop_vertices': loop_vertices,
+        'uv': uv,
+        'location': np.array(obj.location, dtype=np.float32),
+    }
+
+def create_mesh_object( context, name, mesh_name, arrays ):
+    """Creates a mesh object from cached arrays"""
+    mesh = bpy.data.meshes.new(mesh_name)
+    mesh.vertices.add(len(arrays['co']) // 3)
+    mesh.vertices.foreach_set('co', arrays['co'])
+    loop_totals = arrays['loop_totals']
+    mesh.loops.add(len(arrays['loop_vertices']))
+    mesh.loops.foreach_set('vertex_index', arrays['loop_vertices'])
+    mesh.polygons.add(len(loop_totals))
+    loop_starts = np.zeros(len(loop_totals), dtype=np.int32)
+    loop_starts[1:] = np.cumsum(loop_totals)[:-1]
+    mesh.polygons.foreach_set('loop_start', loop_starts)
+    # Since Blender 3.6, the totals are read-only and computed from the starts
+    if bpy.app.version < (3, 6, 0):
+        mesh.polygons.foreach_set('loop_total', loop_totals)
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set('uv', arrays['uv'])
+    mesh.update(calc_edges=True)
+    mesh.validate()
+    obj = bpy.data.objects.new(name, mesh)
+    context.collection.objects.link(obj)
+    obj.location = arrays['location']
+    return obj
+
+class BLUIK_OT_clear_import_cache( bpy.types.Operator ):
+    """Removes all the files of the OCA and OCO import cache"""
+    bl_idname = "bluik.clear_import_cache"
+    bl_label = "Clear import cache"
+    bl_options = {'REGISTER'}
+
+    def execute(self, context):
+        clear_cache()
+        self.report({'INFO'}, "Bluik: the import cache has been cleared")
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
+classes = (
+    BLUIK_OT_clear_import_cache,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
@@ -25,7 +25,13 @@ from bpy_extras.object_utils import world_to_camera_view # pylint: disable=impor
 from mathutils import Matrix # pylint: disable=import-error
 from . import dublf
 from . import tex_anim
-from math import pi
+from . import import_cache
+from math import pi, ceil
+import os
+import hashlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 # General
 def set_2d_viewport(context, camera):
@@ -70,9 +76,10 @@ def create_scene(context, scene_name="", width=0, height=0, background_color = [
     scene.duik_scene.shader = shader
 
     # The camera
-    bpy.ops.object.camera_add('INVOKE_REGION_WIN')
-    cam = context.active_object
-    cam.name = scene_name + '.Camera'
+    cam_data = bpy.data.cameras.new(scene_name + '.Camera')
+    cam = bpy.data.objects.new(scene_name + '.Camera', cam_data)
+    cam.location = context.scene.cursor.location
+    context.view_layer.active_layer_collection.collection.objects.link(cam)
     if scene_type == '2D':
         cam.data.type = 'ORTHO'
         cam.data.ortho_scale = width/100
@@ -138,18 +145,56 @@ def get_containing_scene( context, layer ):
                 return collection
     return None
 
-def create_layer(context, name, width, height, containing_group=None):
-    """Creates a plane used as a layer in a 2D scene"""
-    # Create new mesh
-    bpy.ops.mesh.primitive_plane_add('INVOKE_REGION_WIN')
-    plane = context.active_object
-    # Why does mesh.primitive_plane_add leave the object in edit mode???
-    if plane.mode != 'OBJECT':
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-    plane.dimensions = width*.01, height*.01, 0.0
-    plane.data.name = plane.name = name
-    bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+def create_layer_mesh(name, width, height):
+    """Creates the quad mesh of a layer, with the pixel dimensions applied"""
+    x = width*.005
+    y = height*.005
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(
+        ((-x, -y, 0.0), (x, -y, 0.0), (x, y, 0.0), (-x, y, 0.0)),
+        (),
+        ((0, 1, 2, 3),)
+        )
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set('uv', (0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0))
+    mesh.update()
+    return mesh
+
+def get_shared_mesh_name(width, height):
+    return "Layer.{}x{}".format(width, height)
+
+def is_shared_layer_mesh(mesh, width, height):
+    """Checks if the mesh has been created by get_shared_layer_mesh for this size"""
+    name = get_shared_mesh_name(width, height)
+    if mesh.name != name and not mesh.name.startswith(name + "."):
+        return False
+    # The materials of shared meshes are linked to the objects
+    return len(mesh.materials) == 1 and mesh.materials[0] is None
+
+def get_shared_layer_mesh(width, height, meshes):
+    """Gets the quad mesh shared by all the layers with the same size,
+    meshes is a dict { (width, height): mesh } used to keep track of the shared meshes"""
+    mesh = meshes.get( (width, height) )
+    if mesh is not None:
+        return mesh
+    mesh = create_layer_mesh(get_shared_mesh_name(width, height), width, height)
+    # The materials are linked to the objects
+    mesh.materials.append(None)
+    meshes[ (width, height) ] = mesh
+    return mesh
+
+def create_layer(context, name, width, height, containing_group=None, meshes=None):
+    """Creates a plane used as a layer in a 2D scene.
+    If meshes is a dict, the layers with the same size share their mesh"""
+    # Build the mesh directly: operators are slow, and need a region
+    if meshes is None:
+        mesh = create_layer_mesh(name, width, height)
+    else:
+        mesh = get_shared_layer_mesh(width, height, meshes)
+    plane = bpy.data.objects.new(name, mesh)
+    plane.location = context.scene.cursor.location
+    collection = context.view_layer.active_layer_collection.collection
+    collection.objects.link(plane)
 
     plane.duik_layer.width = width
     plane.duik_layer.height = height
@@ -166,6 +211,41 @@ def create_layer(context, name, width, height, containing_group=None):
 
     return plane
 
+def set_layer_material(layer, material):
+    """Sets the material of the layer, linked to the object if the mesh is shared"""
+    if len(layer.material_slots) == 0:
+        layer.data.materials.append(material)
+        return
+    slot = layer.material_slots[0]
+    if slot.link == 'DATA' and slot.material is not None and layer.data.users == 1:
+        # the mesh is not shared, replace its material
+        slot.material = material
+        return
+    slot.link = 'OBJECT'
+    slot.material = material
+
+def remove_layer_material(material):
+    """Removes the material and its animation if they're not used anymore"""
+    if material.users > 0:
+        return
+    action = None
+    tree = material.node_tree
+    if tree is not None and tree.animation_data is not None:
+        action = tree.animation_data.action
+    bpy.data.materials.remove(material)
+    if action is not None and action.users == 0:
+        bpy.data.actions.remove(action)
+
+def remove_layer(layer):
+    """Removes the layer, and its mesh and materials if they're not used anymore"""
+    mesh = layer.data
+    materials = [slot.material for slot in layer.material_slots if slot.material is not None]
+    bpy.data.objects.remove(layer)
+    if mesh is not None and mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+    for material in materials:
+        remove_layer_material(material)
+
 def set_as_layer(obj, group=None):
     obj.duik_type = 'LAYER'
     if group is not None:
@@ -247,8 +327,206 @@ def set_depth( self, depth ):
         
 # Shaders
 
-def create_layer_shader( layer_name, frames, animated = False, shader='SHADELESS'):
-    """Creates an image shader"""
+# The value of the 'CONSTANT' keyframe interpolation, for foreach_set
+KEY_CONSTANT = 0
+
+def hash_file( path, chunk_size=1048576 ):
+    """Hashes the content of a file, reading it by chunks"""
+    h = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def get_png_memory( path ):
+    """Estimates the memory used by a PNG image once loaded, reading only its header.
+    Returns 0 if the file is not a PNG"""
+    with open(path, 'rb') as f:
+        header = f.read(24)
+    if len(header) < 24 or header[0:8] != b'\x89PNG\r\n\x1a\n':
+        return 0
+    width, height = struct.unpack('>II', header[16:24])
+    return width * height * 4
+
+def read_frame_file( path ):
+    """Reads a frame file, returns its hash and the memory its image will use,
+    or None if the file does not exist"""
+    if not os.path.isfile(path):
+        return None
+    info = import_cache.get_file_info(path)
+    if info is None:
+        info = (hash_file(path), get_png_memory(path))
+        import_cache.set_file_info(path, info)
+    return tuple(info)
+
+class FrameImages():
+    """Loads the images of the frames during an import,
+    using a single image for all the files with the same content"""
+
+    def __init__(self, deduplicate=True, force_reload=True):
+        self.deduplicate = deduplicate
+        # reload the images already loaded from the same files
+        self.force_reload = force_reload
+        # { content hash: image }
+        self.images = {}
+        self.reused = 0
+        self.saved_memory = 0
+        # { path: (hash, memory) } of the files read in advance
+        self.files = {}
+
+    def read_files(self, frames, threads=0):
+        """Reads the frame files in a thread pool before the images are created,
+        so that the disk access and hashing don't block the import"""
+        paths = []
+        for frame in frames:
+            if is_blank_frame(frame):
+                continue
+            path = frame['fileName']
+            if not path in self.files:
+                # reserve it, and don't read it twice
+                self.files[path] = None
+                paths.append(path)
+        if threads < 2 or len(paths) < 2:
+            for path in paths:
+                self.files[path] = read_frame_file(path)
+            return
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for path, info in zip(paths, pool.map(read_frame_file, paths)):
+                self.files[path] = info
+
+    def get_file(self, path):
+        """Gets the hash and memory of the file, reading it if it has not been read in advance"""
+        if not path in self.files:
+            self.files[path] = read_frame_file(path)
+        return self.files[path]
+
+    def load(self, frame):
+        """Gets the image of the frame"""
+        if is_blank_frame(frame):
+            return dublf.materials.get_blank_image()
+        if not self.deduplicate:
+            return self.load_file(frame)
+        info = self.get_file(frame['fileName'])
+        if info is None:
+            return self.load_file(frame)
+
+        file_hash, memory = info
+        im = self.images.get(file_hash)
+        if im is not None:
+            try:
+                im.name
+            except ReferenceError:
+                # removed since (packed in an atlas)
+                im = None
+        if im is not None:
+            self.reused += 1
+            self.saved_memory += memory
+            return im
+        im = self.load_file(frame)
+        if im:
+            self.images[file_hash] = im
+        return im
+
+    def load_file(self, frame):
+        im = load_image(frame['fileName'], check_existing=True, force_reload=self.force_reload)
+        if im:
+            im.name = frame['name']
+        return im
+
+def get_constant_keys( key_frames, values ):
+    """The sorted keyframes and values, keeping the last value of each frame"""
+    key_frames = np.asarray(key_frames, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32)
+    if len(key_frames) == 0:
+        return key_frames, values
+    reversed_frames = key_frames[::-1]
+    key_frames, indices = np.unique(reversed_frames, return_index=True)
+    values = values[::-1][indices]
+    return key_frames, values
+
+def add_constant_keys( curve, key_frames, values ):
+    """Adds all the keyframes to the curve at once, with a constant interpolation.
+    If there are several values for the same frame, the last one is kept"""
+    key_frames, values = get_constant_keys(key_frames, values)
+    if len(key_frames) == 0:
+        return
+    num_keys = len(key_frames)
+
+    points = curve.keyframe_points
+    first = len(points)
+    points.add(num_keys)
+    total = first + num_keys
+
+    co = np.empty(total * 2, dtype=np.float32)
+    points.foreach_get('co', co)
+    co[first*2 + 0::2] = key_frames
+    co[first*2 + 1::2] = values
+    interpolation = np.empty(total, dtype=np.int32)
+    points.foreach_get('interpolation', interpolation)
+    interpolation[first:] = KEY_CONSTANT
+
+    points.foreach_set('co', co)
+    # the handles are not used with a constant interpolation, keep them on the new keys
+    for handle in ('handle_left', 'handle_right'):
+        handles = np.empty(total * 2, dtype=np.float32)
+        points.foreach_get(handle, handles)
+        handles[first*2:] = co[first*2:]
+        points.foreach_set(handle, handles)
+    points.foreach_set('interpolation', interpolation)
+    curve.update()
+
+def set_constant_keys( action, data_path, key_frames, values ):
+    """Replaces the keyframes of the curve with constant keys, only if they're different.
+    Returns True if the curve has changed"""
+    key_frames, values = get_constant_keys(key_frames, values)
+    curve = action.fcurves.find(data_path)
+    if curve is not None:
+        points = curve.keyframe_points
+        if len(points) == len(key_frames):
+            co = np.empty(len(points) * 2, dtype=np.float32)
+            points.foreach_get('co', co)
+            if np.array_equal(co[0::2], key_frames) and np.array_equal(co[1::2], values):
+                return False
+        action.fcurves.remove(curve)
+    curve = action.fcurves.new(data_path)
+    add_constant_keys(curve, key_frames, values)
+    return True
+
+def get_opacity_keys( frames ):
+    """Lists the frames where the opacity changes, and the opacity values,
+    starting from a fully opaque layer"""
+    key_frames = []
+    values = []
+    previous_opacity = 1.0
+    for frame in sorted(frames, key=lambda f: f['frameNumber']):
+        opacity = frame['opacity']
+        if opacity == previous_opacity:
+            continue
+        if len(key_frames) == 0:
+            # keep the layer opaque before the first change
+            key_frames.append(0)
+            values.append(previous_opacity)
+        key_frames.append(frame['frameNumber'])
+        values.append(opacity)
+        previous_opacity = opacity
+    return key_frames, values
+
+def create_layer_shader( layer_name, frames, animated = False, shader='SHADELESS', atlas_size=0, frame_images=None, reference_only=False):
+    """Creates an image shader.
+    If atlas_size is not 0, the frames are packed in atlases of this maximum size (in pixels).
+    frame_images is the FrameImages used to load (and share) the images of the import.
+    If reference_only is True, only the first frame is loaded, the other ones are loaded by the TexAnim when they're displayed"""
+    if frame_images is None:
+        frame_images = FrameImages(False)
+    if animated and atlas_size > 0 and not reference_only:
+        mat = create_layer_atlas_shader(layer_name, frames, shader, atlas_size, frame_images)
+        if mat is not None:
+            return mat
+        print("Duik: Can't pack the frames of " + layer_name + " in an atlas, importing them as separate images")
+
     mat, texture_node = dublf.materials.create_image_material(frames[0]['fileName'], layer_name, shader)
     if animated:
         # create curve for anim
@@ -257,35 +535,223 @@ def create_layer_shader( layer_name, frames, animated = False, shader='SHADELESS
         anim_data.action = action
         curve = action.fcurves.new( 'nodes[\"' + texture_node.name + '\"].duik_texanim_current_index' )
         opacity_curve = action.fcurves.new( 'nodes[\"Opacity\"].inputs[1].default_value' )
-        for frame in frames:
-            if frame['fileName'] == "" or  frame['name'] == "_blank":
-                im = dublf.materials.get_blank_image()
-            else:
-                im = load_image(frame['fileName'], check_existing=True, force_reload=True)
-                if im:
-                    im.name = frame['name']
+        for i, frame in enumerate(frames):
             texAnimIm = texture_node.duik_texanim_images.add()
+            if reference_only and i > 0 and not is_blank_frame(frame):
+                texAnimIm.filepath = frame['fileName']
+                texAnimIm.name = frame['name']
+                continue
+            im = frame_images.load(frame)
             if im:
                 texAnimIm.image = im
                 texAnimIm.name = im.name
-            current_frame = frame['frameNumber']
-            key = curve.keyframe_points.insert( current_frame, len(texture_node.duik_texanim_images) -1 )
-            key.interpolation = 'CONSTANT'
-            current_opacity = opacity_curve.evaluate(current_frame)
-            new_opacity = frame['opacity']
-            if current_opacity != new_opacity:
-                num_keys = len(opacity_curve.keyframe_points)
-                if num_keys == 0 and new_opacity == 1.0: continue
-                if num_keys == 0:
-                    opacity_key = opacity_curve.keyframe_points.insert( 0, current_opacity)
-                    opacity_key.interpolation = 'CONSTANT'
-                opacity_key = opacity_curve.keyframe_points.insert( current_frame, new_opacity)
-                opacity_key.interpolation = 'CONSTANT'
+        add_constant_keys( curve, [f['frameNumber'] for f in frames], np.arange(len(frames)) )
+        add_constant_keys( opacity_curve, *get_opacity_keys(frames) )
+        # let the frame change handler know about this texanim
+        tex_anim.register_texanim_owner(mat)
     else:
         # just set opacity
         mat.node_tree.nodes['Opacity'].inputs[1].default_value = frames[0]['opacity']
     return mat
 
+def get_layer_texture_node( mat ):
+    """The Texture Image node of a layer shader: the TexAnim node if the layer is animated,
+    or the only Texture Image node of the material. None if it can't be found"""
+    tree = mat.node_tree
+    if tree is None:
+        return None
+    anim_data = tree.animation_data
+    texture_nodes = [node for node in tree.nodes if node.bl_idname == 'ShaderNodeTexImage']
+    if anim_data is not None and anim_data.action is not None:
+        for node in texture_nodes:
+            if anim_data.action.fcurves.find(node.path_from_id('duik_texanim_current_index')) is not None:
+                return node
+    if len(texture_nodes) == 1:
+        return texture_nodes[0]
+    return None
+
+def update_layer_shader( mat, frames, animated=False, frame_images=None, reference_only=False ):
+    """Updates the images and the keyframes of a shader created by create_layer_shader,
+    keeping the other changes made to the material.
+    Returns False if the shader can't be updated in place: atlases, or the layer has become animated or still"""
+    if frame_images is None:
+        frame_images = FrameImages(False)
+    tree = mat.node_tree
+    if tree is None or tree.nodes.get('Opacity') is None or tree.nodes.get('Atlas') is not None:
+        return False
+    texture_node = get_layer_texture_node(mat)
+    if texture_node is None:
+        return False
+    action = None
+    if tree.animation_data is not None:
+        action = tree.animation_data.action
+    index_path = texture_node.path_from_id('duik_texanim_current_index')
+    if animated != (action is not None and action.fcurves.find(index_path) is not None):
+        return False
+
+    if not animated:
+        im = frame_images.load(frames[0])
+        if im and texture_node.image != im:
+            texture_node.image = im
+        tree.nodes['Opacity'].inputs[1].default_value = frames[0]['opacity']
+        return True
+
+    # The unchanged files are loaded with the existing images
+    images = texture_node.duik_texanim_images
+    images.clear()
+    for i, frame in enumerate(frames):
+        texAnimIm = images.add()
+        if reference_only and i > 0 and not is_blank_frame(frame):
+            texAnimIm.filepath = frame['fileName']
+            texAnimIm.name = frame['name']
+            continue
+        im = frame_images.load(frame)
+        if im:
+            texAnimIm.image = im
+            texAnimIm.name = im.name
+    set_constant_keys( action, index_path, [f['frameNumber'] for f in frames], np.arange(len(frames)) )
+    set_constant_keys( action, 'nodes[\"Opacity\"].inputs[1].default_value', *get_opacity_keys(frames) )
+    tex_anim.invalidate_applied_index(texture_node)
+    tex_anim.register_texanim_node(texture_node)
+    tex_anim.update_image(texture_node, True)
+    return True
+
+# Atlases
+
+def is_blank_frame( frame ):
+    return frame['fileName'] == "" or frame['name'] == "_blank"
+
+def create_layer_atlases( layer_name, frames, max_size=4096, padding=2, frame_images=None ):
+    """Packs the frames of a layer in one or several atlas images.
+    Returns a tuple (atlases, cells, scale):
+    the list of atlas images, the (atlas index, uv offset) of each frame, and the uv scale of a cell.
+    Returns None if the frames can't be packed (different sizes, bigger than the atlas)"""
+    # Load the drawings; blank frames all use the same empty cell
+    drawings = []
+    drawing_indices = []
+    width = 0
+    height = 0
+    for frame in frames:
+        im = None
+        if not is_blank_frame(frame):
+            if frame_images is None:
+                im = load_image(frame['fileName'], check_existing=True, force_reload=True)
+            else:
+                im = frame_images.load(frame)
+        if im:
+            if width == 0:
+                width, height = im.size
+            elif tuple(im.size) != (width, height):
+                return None
+        if im in drawings:
+            drawing_indices.append(drawings.index(im))
+        else:
+            drawing_indices.append(len(drawings))
+            drawings.append(im)
+    if width == 0 or width > max_size or height > max_size:
+        return None
+
+    # Grid
+    numDrawings = len(drawings)
+    cols = (max_size + padding) // (width + padding)
+    rows = (max_size + padding) // (height + padding)
+    if numDrawings < cols * rows:
+        cols = min(cols, numDrawings)
+        rows = ceil(numDrawings / cols)
+    cells_per_atlas = cols * rows
+    atlas_width = cols * (width + padding) - padding
+    atlas_height = rows * (height + padding) - padding
+    scale = (width / atlas_width, height / atlas_height)
+
+    atlases = []
+    drawing_cells = []
+    pixels = None
+    for i, im in enumerate(drawings):
+        cell = i % cells_per_atlas
+        if cell == 0:
+            if pixels is not None:
+                atlases.append( create_atlas_image(layer_name, len(atlases), pixels) )
+            pixels = np.zeros((atlas_height, atlas_width, 4), dtype=np.float32)
+        # rows from the top, image pixels start at the bottom
+        x = (cell % cols) * (width + padding)
+        y = atlas_height - (cell // cols + 1) * height - (cell // cols) * padding
+        if im is not None:
+            im_pixels = np.empty(width * height * 4, dtype=np.float32)
+            im.pixels.foreach_get(im_pixels)
+            pixels[y:y+height, x:x+width] = im_pixels.reshape(height, width, 4)
+        drawing_cells.append( (len(atlases), (x / atlas_width, y / atlas_height)) )
+    atlases.append( create_atlas_image(layer_name, len(atlases), pixels) )
+
+    # The separate drawings are not needed anymore
+    for im in drawings:
+        if im is not None and im.users == 0:
+            bpy.data.images.remove(im)
+
+    cells = [drawing_cells[i] for i in drawing_indices]
+    return atlases, cells, scale
+
+def create_atlas_image( layer_name, index, pixels ):
+    """Creates and packs an image from the pixel array"""
+    height, width = pixels.shape[0:2]
+    image = bpy.data.images.new(layer_name + '.Atlas.' + str(index), width, height, alpha=True)
+    image.pixels.foreach_set(pixels.ravel())
+    image.pack()
+    return image
+
+def create_layer_atlas_shader( layer_name, frames, shader='SHADELESS', max_size=4096, frame_images=None ):
+    """Creates an image shader where the frames are packed in atlases,
+    animating the uv offset instead of switching images.
+    Returns None if the frames can't be packed"""
+    packed = create_layer_atlases(layer_name, frames, max_size, frame_images=frame_images)
+    if packed is None:
+        return None
+    atlases, cells, scale = packed
+
+    mat, texture_node = dublf.materials.create_image_material(frames[0]['fileName'], layer_name, shader)
+    first_image = texture_node.image
+    texture_node.image = atlases[0]
+    if first_image is not None and first_image.users == 0:
+        bpy.data.images.remove(first_image)
+
+    # UV transformation
+    tree = mat.node_tree
+    coords_node = tree.nodes.new('ShaderNodeTexCoord')
+    mapping_node = tree.nodes.new('ShaderNodeMapping')
+    mapping_node.name = 'Atlas'
+    mapping_node.inputs['Scale'].default_value = (scale[0], scale[1], 1.0)
+    tree.links.new(coords_node.outputs['UV'], mapping_node.inputs['Vector'])
+    tree.links.new(mapping_node.outputs['Vector'], texture_node.inputs['Vector'])
+
+    anim_data = tree.animation_data_create()
+    action = bpy.data.actions.new('OCA.' + layer_name )
+    anim_data.action = action
+    offset_curves = (
+        action.fcurves.new( 'nodes[\"Atlas\"].inputs[1].default_value', index=0 ),
+        action.fcurves.new( 'nodes[\"Atlas\"].inputs[1].default_value', index=1 ),
+    )
+    opacity_curve = action.fcurves.new( 'nodes[\"Opacity\"].inputs[1].default_value' )
+
+    # Switch atlases only if there are several ones
+    curve = None
+    if len(atlases) > 1:
+        for atlas in atlases:
+            texAnimIm = texture_node.duik_texanim_images.add()
+            texAnimIm.image = atlas
+            texAnimIm.name = atlas.name
+        curve = action.fcurves.new( 'nodes[\"' + texture_node.name + '\"].duik_texanim_current_index' )
+
+    key_frames = [f['frameNumber'] for f in frames]
+    offsets = np.array([offset for atlas_index, offset in cells], dtype=np.float32)
+    for i in range(2):
+        add_constant_keys( offset_curves[i], key_frames, offsets[:, i] )
+    if curve is not None:
+        add_constant_keys( curve, key_frames, [atlas_index for atlas_index, offset in cells] )
+    add_constant_keys( opacity_curve, *get_opacity_keys(frames) )
+
+    if curve is not None:
+        tex_anim.register_texanim_owner(mat)
+    return mat
+
 # Classes
 
 axis=(
@@ -319,6 +785,9 @@ class DUIK_SceneSettings( bpy.types.PropertyGroup ):
     background: bpy.props.PointerProperty( type=bpy.types.Object )
     width: bpy.props.IntProperty(default=1920, subtype='PIXEL')
     height: bpy.props.IntProperty(default=1080, subtype='PIXEL')
+    # The OCA document of the scene, and the path of the group in the document
+    oca_file: bpy.props.StringProperty(subtype='FILE_PATH')
+    oca_path: bpy.props.StringProperty()
 
 class DUIK_LayerSettings ( bpy.types.PropertyGroup ):
     camera_position: bpy.props.FloatVectorProperty(
@@ -336,6 +805,11 @@ class DUIK_LayerSettings ( bpy.types.PropertyGroup ):
     width: bpy.props.IntProperty(default=1920, subtype='PIXEL')
     height: bpy.props.IntProperty(default=1080, subtype='PIXEL')
     default_collection: bpy.props.PointerProperty( type=bpy.types.Collection )
+    # The path of the layer in the OCA document,
+    # and what was imported (as JSON) to reload only what has changed
+    oca_path: bpy.props.StringProperty()
+    oca_frames: bpy.props.StringProperty()
+    oca_position: bpy.props.StringProperty()
 
 class DUIK_PT_layer_controls( bpy.types.Panel ):
     bl_space_type = 'VIEW_3D'
@@ -353,6 +827,8 @@ class DUIK_PT_layer_controls( bpy.types.Panel ):
         obj = context.active_object
         duik = obj.duik_layer
         layout.prop( duik, 'depth')
+        if duik.oca_path != "":
+            layout.operator("import_oca.reload", icon='FILE_REFRESH')
 
 class DUIK_OT_create_2d_scene( bpy.types.Operator ):
     bl_idname = "object.2d_duik_scene_add"
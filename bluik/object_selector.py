@@ -22,45 +22,270 @@
 import bpy
 from bpy.app.handlers import persistent 
 from . import dublf
+from . import frame_tables
+from . import scene_scope
 
-def update_object_selector(obj):
-    obj = obj.id_data
-    for o in obj.bluik_object_selector.objects:
-        o = o.obj
-        o.hide_viewport = True
-        o.hide_render = True
-    current = obj.bluik_object_selector.current_index
+# The index currently shown by each object selector, by selector pointer
+shown_indices = {}
+
+def set_object_visible( obj, visible ):
+    """Shows or hides the object (or collection), only writing the properties which change"""
+    if obj is None:
+        return
+    hidden = not visible
+    if obj.hide_viewport != hidden:
+        obj.hide_viewport = hidden
+    if obj.hide_render != hidden:
+        obj.hide_render = hidden
+
+def get_item_target( selector, item, mode=None ):
+    """Returns the object or the collection switched by the item, depending on the selector mode"""
+    if mode is None:
+        mode = selector.mode
+    if mode == 'COLLECTIONS':
+        return item.collection
+    return item.obj
+
+def has_other_mode_items( selector ):
+    """Checks if some items only have a target in the other mode"""
+    for item in selector.objects:
+        if get_item_target(selector, item) is None:
+            if item.obj is not None or item.collection is not None:
+                return True
+    return False
+
+def update_object_selector(selector, force=False):
+    show_selector_index(selector, selector.current_index, force)
+
+def show_selector_index(selector, current, force=False):
+    """Shows the object at the index and hides the others"""
+    objects = selector.objects
+    key = selector.as_pointer()
+    previous = shown_indices.get(key)
+
+    if previous is not None and not force:
+        # Nothing changed
+        if previous == current:
+            return
+        # Only hide the previous object
+        if 0 <= previous < len(objects):
+            set_object_visible(get_item_target(selector, objects[previous]), False)
+    else:
+        for o in objects:
+            set_object_visible(get_item_target(selector, o), False)
+
+    shown_indices[key] = current
     if current < 0:
         return
-    if current >= len(obj.bluik_object_selector.objects):
+    if current >= len(objects):
         return
-    current_obj = obj.bluik_object_selector.objects[current].obj
-    current_obj.hide_viewport = False
-    current_obj.hide_render = False
+    set_object_visible(get_item_target(selector, objects[current]), True)
+
+def invalidate_shown_index( selector ):
+    """Forces the next update of the selector to update all its objects"""
+    shown_indices.pop(selector.as_pointer(), None)
+    invalidate_frame_table(selector)
+
+@persistent
+def clear_shown_indices_handler( *args ):
+    """Pointers and visibilities may have changed after loading a file or undoing"""
+    global selector_registry_dirty
+    shown_indices.clear()
+    selector_frame_tables.clear()
+    selector_registry_dirty = True
 
 def update_current_object( obj, context ):
     """Changes the image used in the Texture Image node"""
+    # baked selectors use keyframes
+    if obj.baked:
+        return
     update_object_selector(obj)
 
-@persistent
 def update_object_handler( scene ):
     """Updates all selector objects visibilities, as the update function does not work on playback"""
-    # get all object selectors in the scene
+    frame = scene.frame_current
+    # only visit the registered object selectors of this scene
+    for selector in get_object_selectors(scene):
+        if selector.baked:
+            continue
+        index = None
+        if selector.use_timeline:
+            index = get_frame_index(selector, frame)
+        if index is None:
+            update_object_selector(selector)
+        else:
+            show_selector_index(selector, index)
+
+# Timelines: the index curves compiled to frame -> index tables
+
+# { selector pointer: (action pointer, (first frame, array('i') of indices) or None if the curve can't be compiled) }
+selector_frame_tables = {}
+
+def get_selector_fcurve( selector ):
+    """Returns the F-Curve animating the current index of the selector, if it is directly keyed in an action"""
+    anim_data = selector.id_data.animation_data
+    if anim_data is None or anim_data.action is None:
+        return None
+    # NLA strips and drivers change the evaluated value
+    if len(anim_data.nla_tracks) > 0:
+        return None
+    data_path = selector.path_from_id('current_index')
+    if anim_data.drivers.find(data_path) is not None:
+        return None
+    return anim_data.action.fcurves.find(data_path)
+
+def get_frame_index( selector, frame ):
+    """Gets the index at the given frame from the compiled timeline,
+    which does not depend on the previous frames.
+    Returns None if the index curve can't be compiled"""
+    key = selector.as_pointer()
+    action_key = frame_tables.get_action_key(selector.id_data)
+    entry = selector_frame_tables.get(key)
+    # compile again when another action has been assigned
+    if entry is None or entry[0] != action_key:
+        entry = (action_key, frame_tables.compile_fcurve(get_selector_fcurve(selector), typecode='i'))
+        selector_frame_tables[key] = entry
+    table = entry[1]
+    if table is None:
+        return None
+    return frame_tables.lookup(table, frame)
+
+def invalidate_frame_table( selector ):
+    """Forces the index curve to be compiled again"""
+    selector_frame_tables.pop(selector.as_pointer(), None)
+
+# Registry of the enabled object selectors
+
+# The objects and pose bones with an enabled selector
+# { (object pointer, bone name): (object, bone name) }, the bone name is empty for objects
+selector_registry = {}
+# Set when the registry has to be rebuilt from bpy.data (load, undo)
+selector_registry_dirty = True
+
+def get_selector_owner_key( owner ):
+    """Returns the registry key and value for an object or a pose bone"""
+    if isinstance(owner, bpy.types.PoseBone):
+        obj = owner.id_data
+        return (obj.as_pointer(), owner.name), (obj, owner.name)
+    return (owner.as_pointer(), ""), (owner, "")
+
+def register_selector_owner( owner ):
+    """Adds (or removes, if its selector is disabled) an object or pose bone to the registry"""
+    key, value = get_selector_owner_key(owner)
+    if owner.bluik_object_selector.enabled:
+        selector_registry[key] = value
+    else:
+        selector_registry.pop(key, None)
+
+def register_selector_object( obj ):
+    """Registers the object and its pose bones"""
+    if obj.bluik_object_selector.enabled:
+        register_selector_owner(obj)
+    if obj.pose is None:
+        return
+    for bone in obj.pose.bones:
+        if bone.bluik_object_selector.enabled:
+            register_selector_owner(bone)
+
+def rebuild_selector_registry():
+    """Scans all objects and pose bones to rebuild the registry"""
+    global selector_registry_dirty
+    selector_registry.clear()
     for obj in bpy.data.objects:
-        if not obj.bluik_object_selector.enabled:
+        register_selector_object(obj)
+    selector_registry_dirty = False
+
+def get_object_selectors( scene=None ):
+    """Returns all the enabled object selectors of objects and pose bones,
+    or only the ones in the scene"""
+    if selector_registry_dirty:
+        rebuild_selector_registry()
+    scope = None
+    if scene is not None:
+        scope = scene_scope.get_scene_scope(scene)
+    selectors = []
+    for key, value in tuple(selector_registry.items()):
+        if scope is not None and not key[0] in scope.objects:
+            continue
+        obj, bone_name = value
+        try:
+            owner = obj
+            if bone_name != "":
+                owner = None
+                if obj.pose is not None:
+                    owner = obj.pose.bones.get(bone_name)
+        except ReferenceError:
+            # The object has been removed
+            del selector_registry[key]
             continue
-        update_object_selector(obj)
+        # The bone has been renamed or removed, or the selector disabled
+        if owner is None or not owner.bluik_object_selector.enabled:
+            del selector_registry[key]
+            if owner is None:
+                register_selector_object(obj)
+            continue
+        selectors.append(owner.bluik_object_selector)
+    return selectors
+
+@persistent
+def selector_depsgraph_handler( scene, depsgraph ):
+    """Registers new objects (duplicated, appended...) with object selectors,
+    and invalidates the timelines of the actions which may have changed"""
+    frame_tables.remove_action_tables(selector_frame_tables, frame_tables.get_updated_actions(depsgraph))
+
+    if selector_registry_dirty:
+        return
+    registered = None
+    for update in depsgraph.updates:
+        obj = update.id.original
+        if not isinstance(obj, bpy.types.Object):
+            continue
+        if registered is None:
+            registered = set(key[0] for key in selector_registry)
+        if obj.as_pointer() in registered:
+            continue
+        register_selector_object(obj)
+
+def update_selector_mode( selector, context ):
+    # The targets of the previous mode are not switched anymore, show them again
+    previous_mode = 'OBJECTS' if selector.mode == 'COLLECTIONS' else 'COLLECTIONS'
+    for item in selector.objects:
+        set_object_visible(get_item_target(selector, item, previous_mode), True)
+    invalidate_shown_index(selector)
+    update_object_selector(selector, True)
 
 class BLUIK_selector_object( bpy.types.PropertyGroup ):
-    """One Object in the Object Selector"""
+    """One Object (or Collection) in the Object Selector"""
     obj: bpy.props.PointerProperty( type = bpy.types.Object )
+    collection: bpy.props.PointerProperty( type = bpy.types.Collection )
     name: bpy.props.StringProperty( name="Object", default="Object")
 
 class BLUIK_object_selector( bpy.types.PropertyGroup ):
     """An Object Selector"""
     objects: bpy.props.CollectionProperty( type = BLUIK_selector_object )
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=(
+            ('OBJECTS', "Objects", "Shows and hides each object"),
+            ('COLLECTIONS', "Collections", "Shows and hides the child collections of a collection; faster when the choices contain many objects"),
+            ),
+        default='OBJECTS',
+        update=update_selector_mode,
+        description="What the selector switches"
+        )
+    collection: bpy.props.PointerProperty(
+        type = bpy.types.Collection,
+        name="Collection",
+        description="The collection containing the choices, in Collections mode"
+        )
     current_index: bpy.props.IntProperty( update=update_current_object, options={'ANIMATABLE','LIBRARY_EDITABLE'} )
     enabled: bpy.props.BoolProperty( default=False )
+    baked: bpy.props.BoolProperty( default=False )
+    use_timeline: bpy.props.BoolProperty(
+        name="Compile timeline",
+        description="Compiles the animated index to a frame by frame table, to switch objects without evaluating the animation. Needs constant keyframes",
+        default=False
+        )
 
 class BLUIK_PT_object_selector( bpy.types.Panel ):
     bl_space_type = 'VIEW_3D'
@@ -87,6 +312,11 @@ class BLUIK_PT_object_selector( bpy.types.Panel ):
 
         layout = self.layout
 
+        layout.prop(selector, "mode", expand=True)
+        layout.prop(selector, "use_timeline")
+        if selector.mode == 'COLLECTIONS':
+            layout.prop(selector, "collection")
+
         row = layout.row()
         row.template_list("UI_UL_list", "bluik_selector", selector, "objects", selector, "current_index" , rows = 5 )
         col = row.column(align=True)
@@ -111,16 +341,22 @@ class BLUIK_OT_object_selector_add_objects( bpy.types.Operator ):
     @classmethod
     def poll( self, context):
         obj = dublf.context.get_active_poseBone_or_object(context)
-        return len(context.selected_objects) > 0 and obj.bluik_object_selector.enabled
+        if len(context.selected_objects) == 0 or not obj.bluik_object_selector.enabled:
+            return False
+        return obj.bluik_object_selector.mode == 'OBJECTS'
             
     def execute(self, context):
         selector = context.active_object.bluik_object_selector
+        if has_other_mode_items(selector):
+            self.report({'ERROR'}, "The selector already contains collections, remove them first")
+            return {'CANCELLED'}
         for obj in context.selected_objects:
             if obj is context.active_object:
                 continue
             sel_obj = selector.objects.add()
             sel_obj.obj = obj
             sel_obj.name = obj.name
+        invalidate_shown_index(selector)
         dublf.ui.redraw()
         return {'FINISHED'}
     
@@ -141,12 +377,28 @@ class BLUIK_OT_object_selector_add_children( bpy.types.Operator ):
             
     def execute(self, context):
         selector = context.active_object.bluik_object_selector
+        if has_other_mode_items(selector):
+            self.report({'ERROR'}, "The selector already contains {}, remove them first".format(
+                'objects' if selector.mode == 'COLLECTIONS' else 'collections'
+            ))
+            return {'CANCELLED'}
+        if selector.mode == 'COLLECTIONS':
+            if selector.collection is None:
+                return {'CANCELLED'}
+            for collection in selector.collection.children:
+                sel_obj = selector.objects.add()
+                sel_obj.collection = collection
+                sel_obj.name = collection.name
+            invalidate_shown_index(selector)
+            dublf.ui.redraw()
+            return {'FINISHED'}
         for obj in context.active_object.children:
             if obj is context.active_object:
                 continue
             sel_obj = selector.objects.add()
             sel_obj.obj = obj
             sel_obj.name = obj.name
+        invalidate_shown_index(selector)
         dublf.ui.redraw()
         return {'FINISHED'}
 
@@ -169,6 +421,7 @@ class BLUIK_OT_object_selector_remove_object( bpy.types.Operator ):
         current_index = selector.current_index
         dublf.animation.remove_animated_index(obj, 'bluik_object_selector.current_index', current_index)
         selector.objects.remove(current_index)
+        invalidate_shown_index(selector)
         dublf.ui.redraw()
         return {'FINISHED'}
 
@@ -191,6 +444,7 @@ class BLUIK_OT_object_selector_remove_all( bpy.types.Operator ):
 
         dublf.animation.remove_all_keyframes(obj, 'bluik_object_selector.current_index')
         selector.objects.clear()
+        invalidate_shown_index(selector)
         dublf.ui.redraw()
         return {'FINISHED'}
 
@@ -224,6 +478,7 @@ class BLUIK_OT_object_selector_move( bpy.types.Operator ):
         dublf.animation.swap_animated_index(obj, 'bluik_object_selector.current_index', current_index, new_index)
 
         objects.move(current_index, new_index)
+        invalidate_shown_index(selector)
         selector.current_index = new_index
 
         return {'FINISHED'}
@@ -246,6 +501,7 @@ class BLUIK_OT_object_selector_add( bpy.types.Operator ):
         obj = dublf.context.get_active_poseBone_or_object(context)
 
         obj.bluik_object_selector.enabled = True
+        register_selector_owner(obj)
         dublf.ui.redraw()
         return {'FINISHED'}
 
@@ -301,12 +557,22 @@ def register():
     bpy.types.VIEW3D_MT_object.append(object_menu_func)
     bpy.types.VIEW3D_MT_pose.append(pose_menu_func)
 
-    # Add handler
-    dublf.handlers.frame_change_post_append( update_object_handler )
+    # Add handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if not clear_shown_indices_handler in handlers:
+            handlers.append(clear_shown_indices_handler)
+    if not selector_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(selector_depsgraph_handler)
     
 def unregister():
-    # Remove handler
-    dublf.handlers.frame_change_post_remove( update_object_handler )
+    # Remove handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if clear_shown_indices_handler in handlers:
+            handlers.remove(clear_shown_indices_handler)
+    if selector_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(selector_depsgraph_handler)
+    shown_indices.clear()
+    selector_registry.clear()
 
     # Menu
     bpy.types.VIEW3D_MT_object.remove(object_menu_func)
@@ -19,14 +19,99 @@
 
 # OCA Import
 
+import os
+import json
 import bpy # pylint: disable=import-error
 from bpy_extras.object_utils import ( # pylint: disable=import-error
     AddObjectHelper,
 )
 from . import dublf
 from . import layers
+from . import proxies
+from . import import_cache
 
-class IMPORT_OCA_OT_import(bpy.types.Operator, AddObjectHelper ):
+class OCAImportOptions():
+    """The options and methods shared by the OCA import and reload operators"""
+
+    deduplicate: bpy.props.BoolProperty(
+        name="Share identical drawings",
+        description="Uses a single image for all the frame files with the same content",
+        default=True
+    )
+
+    share_meshes: bpy.props.BoolProperty(
+        name="Share layer meshes",
+        description="Uses a single mesh for all the layers with the same size, the materials are linked to the objects",
+        default=True
+    )
+
+    reference_only: bpy.props.BoolProperty(
+        name="Reference only",
+        description="Only loads the first drawing of each layer, the other ones are loaded when they're displayed. Useful for layout and blocking",
+        default=False
+    )
+
+    use_atlas: bpy.props.BoolProperty(
+        name="Pack frames in atlases",
+        description="Packs the frames of each animated layer in atlas images and animates the texture coordinates instead of switching images",
+        default=False
+    )
+
+    atlas_size: bpy.props.EnumProperty(
+        name="Atlas size",
+        items=(
+            ('2048',"2048","2048 x 2048 px atlases"),
+            ('4096',"4096","4096 x 4096 px atlases"),
+            ('8192',"8192","8192 x 8192 px atlases"),
+            ),
+        default='4096',
+        description="Maximum size of the atlas images"
+        )
+
+    threads: bpy.props.IntProperty(
+        name="Reading threads",
+        description="Number of threads reading the frame files before creating the images. 0 to read them one by one",
+        default=8,
+        min=0,
+        max=64
+    )
+
+    def create_paint_layer(self, context, ocaLayer, containing_group, depth, path):
+        layer = layers.create_layer(context, ocaLayer['name'], ocaLayer['width'], ocaLayer['height'], containing_group, self.layer_meshes)
+        layers.set_layer_position( layer, ocaLayer['position'] )
+        layer.duik_layer.depth = depth
+        layers.set_layer_material(layer, self.create_layer_material(ocaLayer))
+        set_oca_visibility(layer, ocaLayer)
+        layer.duik_layer.oca_path = path
+        layer.duik_layer.oca_frames = get_frames_state(ocaLayer)
+        layer.duik_layer.oca_position = get_position_state(ocaLayer)
+        return layer
+
+    def create_layer_material(self, ocaLayer):
+        atlas_size = 0
+        if self.use_atlas:
+            atlas_size = int(self.atlas_size)
+        framesShader = layers.create_layer_shader(ocaLayer['name'], ocaLayer['frames'], ocaLayer['animated'], self.shader, atlas_size, self.frame_images, self.reference_only)
+        if ocaLayer['label'] != 0:
+            framesShader.diffuse_color = dublf.oca.OCALabels[ ocaLayer['label'] % 8 +1 ]
+        return framesShader
+
+    def update_layer_material(self, material, ocaLayer):
+        """Updates the images and keyframes of the material in place,
+        returns False if it has to be created again"""
+        if self.use_atlas and ocaLayer['animated'] and not self.reference_only:
+            return False
+        if not layers.update_layer_shader(material, ocaLayer['frames'], ocaLayer['animated'], self.frame_images, self.reference_only):
+            return False
+        if ocaLayer['label'] != 0:
+            material.diffuse_color = dublf.oca.OCALabels[ ocaLayer['label'] % 8 +1 ]
+        return True
+
+    def update_frame_paths( self, frames ):
+        for f in frames:
+            f['fileName'] = os.path.join(self.directory, f['fileName'])
+
+class IMPORT_OCA_OT_import(bpy.types.Operator, AddObjectHelper, OCAImportOptions ):
     """Imports Open Cel Animation as mesh planes"""
     bl_idname = "import_oca.import"
     bl_label = "Import OCA as Duik 2D Scene"
@@ -59,6 +144,12 @@ class IMPORT_OCA_OT_import(bpy.types.Operator, AddObjectHelper ):
         description="Perspective of the scene"
         )
 
+    proxies: bpy.props.BoolProperty(
+        name="Create proxies",
+        description="Writes 1/2, 1/4 and 1/8 resolution copies of the drawings next to the document, to be used in the viewport (see the scene properties)",
+        default=False
+    )
+
     update_timeline: bpy.props.BoolProperty(
         name="Update frame range",
         description="Updates the frame range of the scene according to the imported animation",
@@ -90,6 +181,15 @@ class IMPORT_OCA_OT_import(bpy.types.Operator, AddObjectHelper ):
         box.label(text="Material Settings:", icon='MATERIAL')
         row = box.row()
         row.prop(self, 'shader', expand=True)
+        box.prop(self, 'reference_only')
+        box.prop(self, 'deduplicate')
+        box.prop(self, 'share_meshes')
+        box.prop(self, 'threads')
+        box.prop(self, 'proxies')
+        box.prop(self, 'use_atlas')
+        row = box.row()
+        row.enabled = self.use_atlas and not self.reference_only
+        row.prop(self, 'atlas_size', expand=True)
         # Scene options
         box = layout.box()
         box.label(text="Scene and Render Settings:", icon='SCENE')
@@ -132,61 +232,394 @@ class IMPORT_OCA_OT_import(bpy.types.Operator, AddObjectHelper ):
 
         print("Importing OCA: " + ocaDocument['name'])
 
-        # Scene and render settings
-        if self.update_timeline:
-            context.scene.frame_start = ocaDocument['startTime']
-            context.scene.frame_end = ocaDocument['endTime']
-        if self.update_fps:
-            context.scene.render.fps = ocaDocument['frameRate']
-        if self.update_resolution:
-            context.scene.render.resolution_x = ocaDocument['width']
-            context.scene.render.resolution_y = ocaDocument['height']
-        
-        # Setup 2D Scene
-        scene = layers.create_scene(context, ocaDocument['name'], ocaDocument['width'], ocaDocument['height'], ocaDocument['backgroundColor'], self.scene_type, self.shader)
-        
-        # Layers
-        for layer in ocaDocument['layers']:
-            self.import_layer(context, layer, scene)
+        # Read all the frame files first
+        import_cache.open_cache()
+        try:
+            self.frame_images = layers.FrameImages(self.deduplicate)
+            self.read_frame_files(ocaDocument['layers'])
+
+            # Scene and render settings
+            if self.update_timeline:
+                context.scene.frame_start = ocaDocument['startTime']
+                context.scene.frame_end = ocaDocument['endTime']
+            if self.update_fps:
+                context.scene.render.fps = ocaDocument['frameRate']
+            if self.update_resolution:
+                context.scene.render.resolution_x = ocaDocument['width']
+                context.scene.render.resolution_y = ocaDocument['height']
+
+            # Setup 2D Scene
+            scene = layers.create_scene(context, ocaDocument['name'], ocaDocument['width'], ocaDocument['height'], ocaDocument['backgroundColor'], self.scene_type, self.shader)
+
+            scene.duik_scene.oca_file = self.filepath
+
+            # Layers
+            self.layer_meshes = None
+            if self.share_meshes:
+                self.layer_meshes = {}
+            for layer in ocaDocument['layers']:
+                self.import_layer(context, layer, scene)
+        finally:
+            import_cache.close_cache()
+
+        if self.proxies:
+            proxies.create_document_proxies(scene, self.filepath, int(context.scene.duik_proxy_level))
+
+        if self.frame_images.reused > 0:
+            message = "Duik: {} identical drawings shared, saving about {:.1f} MB".format(
+                self.frame_images.reused,
+                self.frame_images.saved_memory / 1048576
+                )
+            print(message)
+            self.report({'INFO'}, message)
 
         # Let's redraw
         dublf.ui.redraw()
 
         print("OCA correctly imported")
 
-    def import_layer(self, context, ocaLayer, containing_group, depth=0):
+    def import_layer(self, context, ocaLayer, containing_group, depth=0, parent_path=""):
         layer_type = ocaLayer['type']
+        path = get_oca_path(ocaLayer, parent_path)
         
         if layer_type == 'grouplayer':
             print('Importing OCA Group: ' + ocaLayer['name'])
             group = layers.create_group(context, ocaLayer['name'], containing_group)
+            group.duik_scene.oca_path = path
             for layer in ocaLayer['childLayers']:
-                depth = self.import_layer(context, layer, group, depth)
-            group.hide_viewport = not ocaLayer['visible']
-            group.hide_render = ocaLayer['reference']
+                depth = self.import_layer(context, layer, group, depth, path)
+            set_oca_visibility(group, ocaLayer)
         elif layer_type == 'paintlayer':
             print('Importing OCA Layer: ' + ocaLayer['name'])
             depth = depth - .01
-            layer = layers.create_layer(context, ocaLayer['name'], ocaLayer['width'], ocaLayer['height'], containing_group)
-            layers.set_layer_position( layer, ocaLayer['position'] )
-            layer.duik_layer.depth = depth
+            self.create_paint_layer(context, ocaLayer, containing_group, depth, path)
+
+        return depth
+
+    def read_frame_files( self, ocaLayers ):
+        """Updates the paths of the frames of all the layers and reads the files in a thread pool"""
+        frames = []
+        for path, ocaLayer in get_paint_layers(ocaLayers):
             self.update_frame_paths(ocaLayer['frames'])
-            framesShader = layers.create_layer_shader(ocaLayer['name'], ocaLayer['frames'], ocaLayer['animated'], self.shader)
-            if ocaLayer['label'] != 0:
-                framesShader.diffuse_color = dublf.oca.OCALabels[ ocaLayer['label'] % 8 +1 ]
-            layer.data.materials.append(framesShader)
+            frames += ocaLayer['frames']
+        # The references are read when they're loaded
+        if not self.reference_only:
+            self.frame_images.read_files(frames, self.threads)
+
+class IMPORT_OCA_OT_reload(bpy.types.Operator, OCAImportOptions):
+    """Reloads the OCA document of the Duik scene, updating only the layers which have changed"""
+    bl_idname = "import_oca.reload"
+    bl_label = "Reload OCA"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    remove_missing: bpy.props.BoolProperty(
+        name="Remove deleted layers",
+        description="Removes the layers and groups which are not in the document anymore",
+        default=True
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return get_oca_scene(context) is not None
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, 'reference_only')
+        layout.prop(self, 'deduplicate')
+        layout.prop(self, 'share_meshes')
+        layout.prop(self, 'threads')
+        layout.prop(self, 'use_atlas')
+        row = layout.row()
+        row.enabled = self.use_atlas and not self.reference_only
+        row.prop(self, 'atlas_size', expand=True)
+        layout.prop(self, 'remove_missing')
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        scene = get_oca_scene(context)
+        self.filepath = bpy.path.abspath(scene.duik_scene.oca_file)
+        if not os.path.isfile(self.filepath):
+            self.report({'ERROR'}, "Can't find the OCA document: " + self.filepath)
+            return {'CANCELLED'}
+        self.directory = os.path.dirname(self.filepath)
+        self.shader = scene.duik_scene.shader
+
+        # this won't work in edit mode
+        if context.active_object and context.active_object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        self.reload_oca(context, scene)
+
+        return {'FINISHED'}
+
+    def reload_oca(self, context, scene):
+        ocaDocument = dublf.oca.load(self.filepath)
+
+        print("Reloading OCA: " + ocaDocument['name'])
+
+        # What has already been imported
+        self.oca_layers = {}
+        for obj in scene.all_objects:
+            if obj.duik_type == 'LAYER' and obj.duik_layer.oca_path != "":
+                self.oca_layers[obj.duik_layer.oca_path] = obj
+        self.oca_groups = {}
+        for collection in scene.children_recursive:
+            if collection.duik_scene.oca_path != "":
+                self.oca_groups[collection.duik_scene.oca_path] = collection
+
+        # Read only the files of the new and changed layers
+        import_cache.open_cache()
+        try:
+            self.frame_images = layers.FrameImages(self.deduplicate, False)
+            frames = []
+            for path, ocaLayer in get_paint_layers(ocaDocument['layers']):
+                self.update_frame_paths(ocaLayer['frames'])
+                layer = self.oca_layers.get(path)
+                if layer is None or layer.duik_layer.oca_frames != get_frames_state(ocaLayer):
+                    frames += ocaLayer['frames']
+            # The references are read when they're loaded
+            if not self.reference_only:
+                self.frame_images.read_files(frames, self.threads)
+
+            self.layer_meshes = None
+            if self.share_meshes:
+                # reuse the meshes already shared by the layers
+                self.layer_meshes = get_shared_meshes(self.oca_layers.values())
+            self.proxy_level = int(scene.duik_proxy_level)
+            self.added = 0
+            self.updated = 0
+            self.unchanged = 0
+
+            depth = 0
+            for layer in ocaDocument['layers']:
+                depth = self.reload_layer(context, layer, scene, depth)
+        finally:
+            import_cache.close_cache()
+
+        # What remains is not in the document anymore
+        removed = 0
+        if self.remove_missing:
+            for layer in self.oca_layers.values():
+                layers.remove_layer(layer)
+                removed += 1
+            for group in self.oca_groups.values():
+                if len(group.all_objects) == 0:
+                    bpy.data.collections.remove(group)
+
+        message = "Duik: OCA reloaded, {} layers added, {} updated, {} removed, {} unchanged".format(
+            self.added,
+            self.updated,
+            removed,
+            self.unchanged
+            )
+        print(message)
+        self.report({'INFO'}, message)
+
+        # Let's redraw
+        dublf.ui.redraw()
+
+    def reload_layer(self, context, ocaLayer, containing_group, depth=0, parent_path=""):
+        layer_type = ocaLayer['type']
+        path = get_oca_path(ocaLayer, parent_path)
+
+        if layer_type == 'grouplayer':
+            group = self.oca_groups.pop(path, None)
+            if group is None:
+                print('Importing OCA Group: ' + ocaLayer['name'])
+                group = layers.create_group(context, ocaLayer['name'], containing_group)
+                group.duik_scene.oca_path = path
+            elif containing_group.children.get(group.name) is None:
+                # moved to another group
+                dublf.collections.move_collection_to_collection( containing_group, group )
+            set_oca_visibility(group, ocaLayer)
+            for layer in ocaLayer['childLayers']:
+                depth = self.reload_layer(context, layer, group, depth, path)
+        elif layer_type == 'paintlayer':
+            depth = depth - .01
+            layer = self.oca_layers.pop(path, None)
+            if layer is None:
+                print('Importing OCA Layer: ' + ocaLayer['name'])
+                self.create_paint_layer(context, ocaLayer, containing_group, depth, path)
+                self.added += 1
+            elif self.update_paint_layer(layer, ocaLayer, containing_group, depth):
+                print('Updated OCA Layer: ' + ocaLayer['name'])
+                self.updated += 1
+            else:
+                self.unchanged += 1
 
         return depth
 
-    def update_frame_paths( self, frames ):
-        for f in frames:
-            f['fileName'] = self.directory + '/' + f['fileName']
+    def update_paint_layer(self, layer, ocaLayer, containing_group, depth):
+        """Updates what has changed in the layer, returns False if nothing has changed"""
+        updated = False
+
+        if layer.duik_layer.default_collection != containing_group:
+            layers.move_to_group(layer, containing_group)
+            updated = True
+
+        # the order of the layers
+        if abs(layer.duik_layer.depth - depth) > 1e-6:
+            layer.duik_layer.depth = depth
+            updated = True
+
+        if set_oca_visibility(layer, ocaLayer):
+            updated = True
+
+        width = ocaLayer['width']
+        height = ocaLayer['height']
+        if layer.duik_layer.width != width or layer.duik_layer.height != height:
+            material = None
+            if len(layer.material_slots) > 0:
+                material = layer.material_slots[0].material
+            mesh = layer.data
+            if self.layer_meshes is None:
+                layer.data = layers.create_layer_mesh(ocaLayer['name'], width, height)
+            else:
+                layer.data = layers.get_shared_layer_mesh(width, height, self.layer_meshes)
+            if material is not None:
+                layers.set_layer_material(layer, material)
+            if mesh.users == 0:
+                if self.layer_meshes is not None and self.layer_meshes.get( (layer.duik_layer.width, layer.duik_layer.height) ) == mesh:
+                    del self.layer_meshes[ (layer.duik_layer.width, layer.duik_layer.height) ]
+                bpy.data.meshes.remove(mesh)
+            layer.duik_layer.width = width
+            layer.duik_layer.height = height
+            updated = True
+
+        position = get_position_state(ocaLayer)
+        if layer.duik_layer.oca_position != position:
+            layers.set_layer_position( layer, ocaLayer['position'] )
+            layer.duik_layer.oca_position = position
+            updated = True
+
+        frames = get_frames_state(ocaLayer)
+        if layer.duik_layer.oca_frames != frames:
+            reload_changed_images(layer.duik_layer.oca_frames, frames, self.proxy_level)
+            material = None
+            if len(layer.material_slots) > 0:
+                material = layer.material_slots[0].material
+            # keep the material and its user changes if possible
+            if material is None or not self.update_layer_material(material, ocaLayer):
+                layers.set_layer_material(layer, self.create_layer_material(ocaLayer))
+                if material is not None:
+                    layers.remove_layer_material(material)
+            layer.duik_layer.oca_frames = frames
+            updated = True
+
+        return updated
+
+def get_oca_scene(context):
+    """The Duik scene imported from an OCA document containing the active object or collection"""
+    scene = None
+    if context.active_object is not None:
+        scene = layers.get_containing_scene(context, context.active_object)
+    if scene is None:
+        collection = context.collection
+        if collection is not None and collection.duik_type == 'SCENE':
+            scene = collection
+    if scene is None or scene.duik_scene.oca_file == "":
+        return None
+    return scene
+
+def set_oca_visibility( layer, ocaLayer ):
+    """Shows or hides the layer or group (collection) as in the document,
+    returns True if the visibility has changed"""
+    hide_viewport = not ocaLayer['visible']
+    hide_render = ocaLayer['reference']
+    if layer.hide_viewport == hide_viewport and layer.hide_render == hide_render:
+        return False
+    layer.hide_viewport = hide_viewport
+    layer.hide_render = hide_render
+    return True
+
+def get_shared_meshes( layer_objects ):
+    """The shared meshes used by the layers, { (width, height): mesh }"""
+    meshes = {}
+    for layer in layer_objects:
+        width = layer.duik_layer.width
+        height = layer.duik_layer.height
+        if (width, height) in meshes:
+            continue
+        if layer.data is not None and layers.is_shared_layer_mesh(layer.data, width, height):
+            meshes[ (width, height) ] = layer.data
+    return meshes
+
+def get_paint_layers( ocaLayers, parent_path="" ):
+    """Lists all the paint layers, including the ones in groups, with their path"""
+    paint_layers = []
+    for ocaLayer in ocaLayers:
+        path = get_oca_path(ocaLayer, parent_path)
+        if ocaLayer['type'] == 'grouplayer':
+            paint_layers += get_paint_layers(ocaLayer['childLayers'], path)
+        elif ocaLayer['type'] == 'paintlayer':
+            paint_layers.append( (path, ocaLayer) )
+    return paint_layers
+
+def get_oca_path( ocaLayer, parent_path ):
+    """The path of the layer in the document"""
+    if parent_path == "":
+        return ocaLayer['name']
+    return parent_path + '/' + ocaLayer['name']
+
+def get_frames_state( ocaLayer ):
+    """What's imported from the frames of the layer, as JSON, to know what has changed when reloading"""
+    frames = []
+    for frame in ocaLayer['frames']:
+        path = frame['fileName']
+        modified = 0
+        size = 0
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            modified = stat.st_mtime
+            size = stat.st_size
+        frames.append( (frame['name'], path, modified, size, frame['frameNumber'], frame['opacity']) )
+    return json.dumps({
+        'animated': ocaLayer['animated'],
+        'label': ocaLayer['label'],
+        'frames': frames,
+    })
+
+def get_position_state( ocaLayer ):
+    return json.dumps(list(ocaLayer['position']))
+
+def reload_changed_images( previous_state, state, proxy_level=1 ):
+    """Reloads the images of the frame files which have changed since the previous state,
+    and writes their proxies again"""
+    previous_files = {}
+    if previous_state != "":
+        for frame in json.loads(previous_state)['frames']:
+            previous_files[frame[1]] = frame[2:4]
+    changed = set()
+    for frame in json.loads(state)['frames']:
+        path = frame[1]
+        if path == "" or not path in previous_files:
+            continue
+        if previous_files[path] != frame[2:4]:
+            changed.add(os.path.normpath(path))
+    if len(changed) == 0:
+        return
+    for image in bpy.data.images:
+        if image.source != 'FILE':
+            continue
+        # with proxies, the file path is the one of the proxy
+        full_path = image.get("bluik_full_path", image.filepath)
+        if not os.path.normpath(bpy.path.abspath(full_path)) in changed:
+            continue
+        if "bluik_proxies" in image:
+            proxies.update_image_proxies(image, proxy_level)
+        image.reload()
+
+def reload_oca_button(self, context):
+    self.layout.operator(IMPORT_OCA_OT_reload.bl_idname, icon='FILE_REFRESH')
 
 def import_oca_button(self, context):
     self.layout.operator(IMPORT_OCA_OT_import.bl_idname, text="OCA as Duik 2D Scene", icon='ONIONSKIN_ON')
 
 classes = (
     IMPORT_OCA_OT_import,
+    IMPORT_OCA_OT_reload,
 )
 
 def register():
@@ -196,6 +629,7 @@ def register():
 
     # Menu item
     bpy.types.TOPBAR_MT_file_import.append(import_oca_button)
+    bpy.types.TOPBAR_MT_file_import.append(reload_oca_button)
 
 def unregister():
     # unregister
@@ -203,4 +637,5 @@ def unregister():
         bpy.utils.unregister_class(cls)
 
     # Menu item
+    bpy.types.TOPBAR_MT_file_import.remove(reload_oca_button)
     bpy.types.TOPBAR_MT_file_import.remove(import_oca_button)
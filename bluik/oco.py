@@ -34,6 +34,9 @@ from . import dublf
 from .dublf import image as ilib # pylint: disable=import-error
 from .dublf import geo # pylint: disable=import-error
 from . import layers
+from . import object_selector
+from . import proxies
+from . import import_cache
 
 class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
     """Imports Open Cut-Out Assets"""
@@ -74,6 +77,22 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
         description="Threshold in the alpha channel in which the selected pixel is considered visible",
     )
 
+    selector_mode: bpy.props.EnumProperty(
+        name="Frames",
+        items=(
+            ('OBJECTS', "Objects", "Switches the frames of animated layers by showing and hiding each object"),
+            ('COLLECTIONS', "Collections", "Puts each frame of animated layers in its own collection, and switches the collections"),
+            ),
+        default='OBJECTS',
+        description="How the frames of animated layers are switched"
+        )
+
+    proxies: bpy.props.BoolProperty(
+        name="Create proxies",
+        description="Writes 1/2, 1/4 and 1/8 resolution copies of the drawings next to the document, to be used in the viewport (see the scene properties)",
+        default=False
+    )
+
     # Utils
     progress=0
 
@@ -111,6 +130,20 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
         row = col.row(align=True)
         row.prop(self, 'shader', expand=True)
 
+        row = col.row(align=True)
+        row.prop(self, 'proxies')
+
+        # animation
+        col = self.layout.box()
+        col = col.column(align=True)
+        row = col.row()
+        row.label(text="Animation", icon="ONIONSKIN_ON")
+
+        spacer(col)
+
+        row = col.row(align=True)
+        row.prop(self, 'selector_mode', expand=True)
+
     def invoke(self, context, event):
         engine = context.scene.render.engine
         if engine not in {'CYCLES', 'BLENDER_EEVEE'}:
@@ -150,13 +183,18 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
         scene = layers.get_create_scene(context)
 
         self.progressStart(context)
-
-        # Layers
-        for layer in ocoDocument['layers']:
-            self.import_layer(context, layer, ocoDocument, scene)
-
+        import_cache.open_cache()
+        try:
+            # Layers
+            for layer in ocoDocument['layers']:
+                self.import_layer(context, layer, ocoDocument, scene)
+        finally:
+            import_cache.close_cache()
         self.progressEnd(context)
 
+        if self.proxies:
+            proxies.create_document_proxies(scene, self.filepath, int(context.scene.duik_proxy_level))
+
         # Let's redraw
         dublf.ui.redraw()
 
@@ -216,6 +254,18 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
             print("Import failed")
             return None
 
+        # The mesh may have already been traced from this drawing
+        cache_key = None
+        if import_cache.cache_root is not None:
+            content_hash = layers.read_frame_file(image_path)[0]
+            cache_key = import_cache.get_mesh_key(content_hash, self.smooth, self.cutoff)
+            arrays = import_cache.load_mesh(cache_key)
+            if arrays is not None:
+                obj = import_cache.create_mesh_object(context, name + ".Cutout", name + ".duik_mesh", arrays)
+                mat = self.create_cutout_material(image, opacity)
+                obj.data.materials.append(mat)
+                return obj, mat
+
         # We need an image editor
         #bpy.ops.render.view_show("INVOKE_DEFAULT")
 
@@ -373,8 +423,7 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
             # context.view_layer.objects.active = obj
 
             # if self.prg.create_material:
-            mat, texture_node = dublf.materials.create_im_material(image, "cutout_" + image.name, self.shader)
-            mat.node_tree.nodes['Opacity'].inputs[1].default_value = opacity
+            mat = self.create_cutout_material(image, opacity)
             obj.data.materials.append(mat)
 
             return obj, mat
@@ -417,8 +466,16 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
         # set location
         obj.location = objloc
 
+        if cache_key is not None:
+            import_cache.save_mesh(cache_key, import_cache.get_mesh_arrays(obj))
+
         return obj, mat
 
+    def create_cutout_material(self, image, opacity):
+        mat, texture_node = dublf.materials.create_im_material(image, "cutout_" + image.name, self.shader)
+        mat.node_tree.nodes['Opacity'].inputs[1].default_value = opacity
+        return mat
+
     def create_layer_control(self, context, ocoLayer, frames):
         # Add an empty + object selector
         empty = bpy.data.objects.new(ocoLayer['name'], None)
@@ -430,11 +487,24 @@ class IMPORT_OCO_OT_import(bpy.types.Operator, AddObjectHelper):
         containing_group = layers.get_containing_group(context, frames[0])
         print(containing_group)
         layers.set_as_layer(empty, containing_group)
-        empty.bluik_object_selector.enabled = True
-        for frame in frames:
-            o = empty.bluik_object_selector.objects.add()
-            o.obj = frame
-            o.name = frame.name   
+        selector = empty.bluik_object_selector
+        selector.enabled = True
+        if self.selector_mode == 'COLLECTIONS' and containing_group is not None:
+            # One collection per frame
+            selector.mode = 'COLLECTIONS'
+            selector.collection = containing_group
+            for frame in frames:
+                group = layers.create_group(context, frame.name.replace('.', ' '), containing_group)
+                layers.move_to_group(frame, group)
+                o = selector.objects.add()
+                o.collection = group
+                o.name = group.name
+        else:
+            for frame in frames:
+                o = selector.objects.add()
+                o.obj = frame
+                o.name = frame.name
+        object_selector.register_selector_owner(empty)
         dublf.rigging.set_object_parent(frames, empty)
 
     def progressStart(self, context):
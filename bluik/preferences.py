@@ -21,6 +21,10 @@ import bpy # pylint: disable=import-error
 from bpy.app.handlers import persistent
 from bluik import dublf # pylint: disable=import-error
 
+def get_preferences():
+    """The preferences of the add-on"""
+    return bpy.context.preferences.addons[__package__].preferences
+
 class BLUIK_OpenURL(dublf.ops.OpenURL):
     bl_idname = "bluik.openurl"
 
@@ -87,6 +91,85 @@ class BLUIK_Preferences( bpy.types.AddonPreferences ):
         default=True
         )
 
+    texanim_cache_enabled: bpy.props.BoolProperty(
+        name="Manage TexAnim image memory",
+        description="Loads the TexAnim images around the current frame and frees the least recently used ones when the memory budget is exceeded",
+        default=True
+        )
+    texanim_cache_size: bpy.props.IntProperty(
+        name="Memory budget",
+        description="Maximum memory used by the TexAnim images, in megabytes",
+        default=2048,
+        min=64,
+        subtype='UNSIGNED'
+        )
+    texanim_preload_before: bpy.props.IntProperty(
+        name="Frames before",
+        description="Number of frames before the current frame for which to keep the TexAnim images loaded",
+        default=2,
+        min=0
+        )
+    texanim_preload_after: bpy.props.IntProperty(
+        name="Frames after",
+        description="Number of frames after the current frame for which to preload the TexAnim images",
+        default=12,
+        min=0
+        )
+
+    texanim_prefetch_threads: bpy.props.IntProperty(
+        name="Reading threads",
+        description="Number of background threads reading the upcoming TexAnim image files. 0 to load them on the main thread",
+        default=4,
+        min=0,
+        max=32
+        )
+
+    texanim_preload_decodes: bpy.props.IntProperty(
+        name="Preloads per frame",
+        description="Maximum number of upcoming TexAnim images decoded on each frame change. Blender decodes the images on the main thread: lower it if the playback stutters. 0 only loads the displayed images",
+        default=2,
+        min=0,
+        max=64
+        )
+
+    import_cache_enabled: bpy.props.BoolProperty(
+        name="Cache imports",
+        description="Keeps the frame file hashes and the cut-out meshes of the OCA and OCO imports on disk, to import the same assets faster",
+        default=True
+        )
+    import_cache_dir: bpy.props.StringProperty(
+        name="Cache folder",
+        description="Where the import cache is stored. Leave empty to use the Blender user data folder",
+        default="",
+        subtype='DIR_PATH'
+        )
+    import_cache_size: bpy.props.IntProperty(
+        name="Cache size",
+        description="Maximum size of the import cache, in megabytes. The least recently used files are removed first",
+        default=1024,
+        min=16,
+        subtype='UNSIGNED'
+        )
+
+    handler_timings_enabled: bpy.props.BoolProperty(
+        name="Measure the frame change handlers",
+        description="Records the time used by each Bluik feature on frame changes",
+        default=False
+        )
+    handler_timings_samples: bpy.props.IntProperty(
+        name="Frames",
+        description="Number of frames used to compute the rolling timings",
+        default=250,
+        min=10,
+        max=10000
+        )
+    handler_timings_csv: bpy.props.StringProperty(
+        name="CSV file",
+        description="Writes the timings of each frame to this CSV file. Leave empty to only display them",
+        default="",
+        subtype='FILE_PATH'
+        )
+
     def draw(self, context):
         layout = self.layout
 
@@ -105,6 +188,36 @@ class BLUIK_Preferences( bpy.types.AddonPreferences ):
         layout.prop(self, "pie_menu_autorig")
         layout.prop(self, "pie_menu_armature_display")
         layout.prop(self, "pie_menu_animation")
+
+        layout.label(text="TexAnim image cache:")
+        layout.prop(self, "texanim_cache_enabled")
+        col = layout.column()
+        col.enabled = self.texanim_cache_enabled
+        col.prop(self, "texanim_cache_size", text="Memory budget (MB)")
+        row = col.row(align=True)
+        row.prop(self, "texanim_preload_before")
+        row.prop(self, "texanim_preload_after")
+        col.prop(self, "texanim_prefetch_threads")
+        col.prop(self, "texanim_preload_decodes")
+
+        layout.label(text="OCA / OCO import cache:")
+        layout.prop(self, "import_cache_enabled")
+        col = layout.column()
+        col.enabled = self.import_cache_enabled
+        col.prop(self, "import_cache_dir")
+        col.prop(self, "import_cache_size", text="Cache size (MB)")
+        col.operator("bluik.clear_import_cache", icon='TRASH')
+
+        layout.label(text="Frame change handlers:")
+        layout.prop(self, "handler_timings_enabled")
+        col = layout.column()
+        col.enabled = self.handler_timings_enabled
+        col.prop(self, "handler_timings_samples")
+        col.prop(self, "handler_timings_csv")
+        # frame_handlers imports this module
+        from . import frame_handlers
+        frame_handlers.draw_timings(col)
+        col.operator("bluik.reset_handler_timings", icon='LOOP_BACK')
         
 @persistent
 def checkUpdateHandler(arg1, arg2):
@@ -0,0 +1,325 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# Downscaled proxies (1/2, 1/4, 1/8) of the imported drawings,
+# to save memory and texture uploads in the viewport
+
+import os
+import hashlib
+import numpy as np
+import bpy # pylint: disable=import-error
+from bpy.app.handlers import persistent # pylint: disable=import-error
+from . import tex_anim
+
+PROXY_FOLDER = "bluik_proxies"
+PROXY_LEVELS = (2, 4, 8)
+
+# The proxy level to restore after a full resolution render started from the UI
+pending_level = 1
+# Set by the render handlers, which run in the render job thread
+render_finished = False
+
+def get_proxy_path( path, root, level ):
+    """The path of the proxy of the file at the given level (2, 4 or 8).
+    The name contains a hash of the full path, as drawings in different folders may have the same name"""
+    path = os.path.normcase(os.path.abspath(path))
+    path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(path))[0] + "_" + path_hash + ".png"
+    return os.path.join(root, "1_" + str(level), name)
+
+def downscale( pixels ):
+    """Halves the size of the pixel array (height, width, 4), averaging the premultiplied colors"""
+    height = pixels.shape[0] // 2 * 2
+    width = pixels.shape[1] // 2 * 2
+    pixels = pixels[:height, :width]
+    alpha = pixels[:, :, 3:4]
+    premultiplied = np.concatenate((pixels[:, :, :3] * alpha, alpha), axis=2)
+    result = premultiplied.reshape(height // 2, 2, width // 2, 2, 4).mean(axis=(1, 3))
+    alpha = result[:, :, 3:4]
+    result[:, :, :3] = np.divide(result[:, :, :3], alpha, out=np.zeros_like(result[:, :, :3]), where=alpha > 0)
+    return result
+
+def save_proxy( pixels, path ):
+    """Writes the pixels to a PNG file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    height, width = pixels.shape[0:2]
+    image = bpy.data.images.new("Bluik proxy", width, height, alpha=True)
+    image.pixels.foreach_set(pixels.ravel())
+    image.filepath_raw = path
+    image.file_format = 'PNG'
+    image.save()
+    bpy.data.images.remove(image)
+
+def is_up_to_date( path, source_path ):
+    return os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(source_path)
+
+def create_image_proxies( image, root ):
+    """Writes the proxies of the image in the root folder if they're not up to date,
+    and remembers them on the image. Returns False if the image can't have proxies"""
+    if image.source != 'FILE' or image.packed_file is not None:
+        return False
+    full_path = image.get("bluik_full_path", image.filepath)
+    source_path = bpy.path.abspath(full_path)
+    if not os.path.isfile(source_path):
+        return False
+
+    paths = [get_proxy_path(source_path, root, level) for level in PROXY_LEVELS]
+    if not all(is_up_to_date(path, source_path) for path in paths):
+        if image.filepath != full_path:
+            image.filepath = full_path
+        was_loaded = image.has_data
+        width, height = image.size
+        if width < max(PROXY_LEVELS) or height < max(PROXY_LEVELS):
+            return False
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        pixels = pixels.reshape(height, width, 4)
+        for level, path in zip(PROXY_LEVELS, paths):
+            # each level is half the previous one
+            pixels = downscale(pixels)
+            save_proxy(pixels, path)
+        if not was_loaded:
+            image.buffers_free()
+
+    image["bluik_full_path"] = full_path
+    image["bluik_proxies"] = paths
+    return True
+
+def update_image_proxies( image, level ):
+    """Writes the proxies of the image again if its file has changed, and switches it to the level"""
+    paths = image.get("bluik_proxies")
+    if not paths:
+        return
+    # the proxies are in root/1_level/
+    root = os.path.dirname(os.path.dirname(paths[0]))
+    create_image_proxies(image, root)
+    set_image_level(image, level)
+
+def get_material_images( material ):
+    """Lists the images used by the material, including all the images of its TexAnims"""
+    images = set()
+    if material is None or material.node_tree is None:
+        return images
+    for node in material.node_tree.nodes:
+        if node.bl_idname != 'ShaderNodeTexImage':
+            continue
+        if node.image is not None:
+            images.add(node.image)
+        for item in node.duik_texanim_images:
+            if item.image is not None:
+                images.add(item.image)
+    return images
+
+def create_scene_proxies( scene, root ):
+    """Creates the proxies of all the images used by the layers of the Duik scene,
+    returns the number of images with proxies"""
+    images = set()
+    for obj in scene.all_objects:
+        for slot in obj.material_slots:
+            images |= get_material_images(slot.material)
+    num_proxies = 0
+    for image in images:
+        if create_image_proxies(image, root):
+            num_proxies += 1
+    return num_proxies
+
+def create_document_proxies( scene, filepath, level ):
+    """Creates the proxies of the images of the scene in a folder next to the imported document,
+    and switches the images to the given level"""
+    root = os.path.join(os.path.dirname(filepath), PROXY_FOLDER)
+    num_proxies = create_scene_proxies(scene, root)
+    set_proxy_level(level)
+    print("Duik: created the proxies of {} images in {}".format(num_proxies, root))
+
+def set_image_level( image, level ):
+    """Uses the proxy at the given level (1 for the full resolution)"""
+    full_path = image.get("bluik_full_path")
+    if full_path is None:
+        return
+    path = full_path
+    if level in PROXY_LEVELS:
+        proxy_path = image["bluik_proxies"][PROXY_LEVELS.index(level)]
+        if os.path.isfile(proxy_path):
+            path = proxy_path
+    # Changing the path reloads the image
+    if image.filepath != path:
+        image.filepath = path
+
+def set_proxy_level( level ):
+    """Switches all the images with proxies to the given level"""
+    changed = False
+    for image in bpy.data.images:
+        if not "bluik_full_path" in image:
+            continue
+        set_image_level(image, level)
+        changed = True
+    if changed:
+        # the sizes of the images have changed
+        tex_anim.clear_image_cache()
+
+def update_proxy_level( scene, context ):
+    set_proxy_level(int(scene.duik_proxy_level))
+
+def restore_proxy_level_timer():
+    """Switches back to the proxies on the main thread, once the render has finished"""
+    if not render_finished:
+        return 0.5
+    set_proxy_level(pending_level)
+    return None
+
+@persistent
+def proxies_render_init_handler( scene, *args ):
+    # Renders started from the UI run in a job thread, where the images can't be reloaded:
+    # BLUIK_OT_render_full_resolution (and the F12 shortcuts) switches them before rendering.
+    # Command line renders run on the main thread.
+    if not bpy.app.background:
+        return
+    if scene.duik_proxy_render_full and scene.duik_proxy_level != '1':
+        set_proxy_level(1)
+
+@persistent
+def proxies_render_end_handler( scene, *args ):
+    global render_finished
+    if not bpy.app.background:
+        render_finished = True
+        return
+    if scene.duik_proxy_render_full and scene.duik_proxy_level != '1':
+        set_proxy_level(int(scene.duik_proxy_level))
+
+class BLUIK_OT_render_full_resolution( bpy.types.Operator ):
+    """Renders with the full resolution images, then switches back to the proxies"""
+    bl_idname = "bluik.render_full_resolution"
+    bl_label = "Render full resolution"
+    bl_options = {'REGISTER'}
+
+    animation: bpy.props.BoolProperty( name="Animation", default=False )
+    use_scene_setting: bpy.props.BoolProperty(
+        name="Use scene setting",
+        description="Only switches to the full resolution images if the scene uses them for renders (F12 shortcuts)",
+        default=False,
+        options={'SKIP_SAVE'}
+        )
+
+    def execute(self, context):
+        global pending_level
+        global render_finished
+        scene = context.scene
+        if scene.duik_proxy_level == '1' or (self.use_scene_setting and not scene.duik_proxy_render_full):
+            result = bpy.ops.render.render('INVOKE_DEFAULT', animation=self.animation)
+            if 'CANCELLED' in result:
+                return {'CANCELLED'}
+            return {'FINISHED'}
+        if bpy.app.timers.is_registered(restore_proxy_level_timer):
+            self.report({'ERROR'}, "A render is already running")
+            return {'CANCELLED'}
+        pending_level = int(scene.duik_proxy_level)
+        render_finished = False
+        set_proxy_level(1)
+        result = bpy.ops.render.render('INVOKE_DEFAULT', animation=self.animation)
+        if not 'RUNNING_MODAL' in result and not 'FINISHED' in result:
+            set_proxy_level(pending_level)
+            return {'CANCELLED'}
+        bpy.app.timers.register(restore_proxy_level_timer, first_interval=0.5)
+        return {'FINISHED'}
+
+class BLUIK_PT_proxies( bpy.types.Panel ):
+    bl_label = "Bluik Proxies"
+    bl_idname = "BLUIK_PT_proxies"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "scene"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        layout.prop(scene, 'duik_proxy_level', expand=True)
+        layout.prop(scene, 'duik_proxy_render_full')
+        row = layout.row(align=True)
+        row.operator("bluik.render_full_resolution", text="Render Image", icon='RENDER_STILL').animation = False
+        row.operator("bluik.render_full_resolution", text="Render Animation", icon='RENDER_ANIMATION').animation = True
+
+classes = (
+    BLUIK_OT_render_full_resolution,
+    BLUIK_PT_proxies,
+)
+
+addon_keymaps = []
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    # F12 renders run in a job thread where the images can't be switched,
+    # the shortcuts switch them before rendering
+    kc = bpy.context.window_manager.keyconfigs.addon
+    if kc:
+        km = kc.keymaps.new(name='Screen', space_type='EMPTY')
+        kmi = km.keymap_items.new(BLUIK_OT_render_full_resolution.bl_idname, 'F12', 'PRESS')
+        kmi.properties.use_scene_setting = True
+        addon_keymaps.append((km, kmi))
+        kmi = km.keymap_items.new(BLUIK_OT_render_full_resolution.bl_idname, 'F12', 'PRESS', ctrl=True)
+        kmi.properties.animation = True
+        kmi.properties.use_scene_setting = True
+        addon_keymaps.append((km, kmi))
+
+    if not hasattr( bpy.types.Scene, 'duik_proxy_level' ):
+        bpy.types.Scene.duik_proxy_level = bpy.props.EnumProperty(
+            name="Resolution",
+            items=(
+                ('1', "Full", "Full resolution images"),
+                ('2', "1/2", "Half resolution proxies"),
+                ('4', "1/4", "Quarter resolution proxies"),
+                ('8', "1/8", "1/8 resolution proxies"),
+                ),
+            default='1',
+            description="The resolution of the images imported with proxies",
+            update=update_proxy_level
+            )
+    if not hasattr( bpy.types.Scene, 'duik_proxy_render_full' ):
+        bpy.types.Scene.duik_proxy_render_full = bpy.props.BoolProperty(
+            name="Full resolution renders",
+            description="Uses the full resolution images when rendering with F12, Ctrl F12 or from the command line",
+            default=True
+            )
+
+    if not proxies_render_init_handler in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.append(proxies_render_init_handler)
+    for handlers in (bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+        if not proxies_render_end_handler in handlers:
+            handlers.append(proxies_render_end_handler)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+
+    for km, kmi in addon_keymaps:
+        km.keymap_items.remove(kmi)
+    addon_keymaps.clear()
+
+    if bpy.app.timers.is_registered(restore_proxy_level_timer):
+        bpy.app.timers.unregister(restore_proxy_level_timer)
+    if proxies_render_init_handler in bpy.app.handlers.render_init:
+        bpy.app.handlers.render_init.remove(proxies_render_init_handler)
+    for handlers in (bpy.app.handlers.render_complete, bpy.app.handlers.render_cancel):
+        if proxies_render_end_handler in handlers:
+            handlers.remove(proxies_render_end_handler)
+
+    del bpy.types.Scene.duik_proxy_level
+    del bpy.types.Scene.duik_proxy_render_full
@@ -0,0 +1,477 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# Bakes the TexAnims, Object Selectors and Camera Linkers to native Blender data,
+# so that renders don't need the frame change handlers
+
+import os
+import shutil
+import time
+import bpy # pylint: disable=import-error
+from . import dublf
+from . import tex_anim
+from . import object_selector
+from . import cam_linker
+from . import frame_handlers
+
+BAKE_FOLDER = "bluik_bake"
+# The number of frames played to measure the handlers
+TIMING_FRAMES = 48
+# The visibility keys created by the bake, on each object:
+# { data path: { 'created': bool, 'frames': [], 'replaced': { frame: previous value } } }
+BAKED_KEYS_PROP = "bluik_baked_keys"
+# The file formats of the transparent images written for the blank cells
+BLANK_FORMATS = {
+    '.png': 'PNG',
+    '.tga': 'TARGA',
+    '.tif': 'TIFF',
+    '.tiff': 'TIFF',
+    '.exr': 'OPEN_EXR',
+    '.webp': 'WEBP',
+}
+
+# TexAnim
+
+def get_texanim_bake_dir( node ):
+    """The folder where the image sequence of the node is written"""
+    owner = tex_anim.get_tree_owner(node.id_data)
+    name = bpy.path.clean_name(owner.name + "_" + node.name)
+    return os.path.join( bpy.path.abspath("//" + BAKE_FOLDER), name )
+
+def get_texanim_index( node, frame ):
+    """Evaluates the image index of the TexAnim at the given frame"""
+    index = tex_anim.get_frame_index(node, frame)
+    if index is not None:
+        return index
+    curve = tex_anim.get_texanim_fcurve(node)
+    if curve is None:
+        index = node.duik_texanim_current_index
+    else:
+        index = int(curve.evaluate(frame))
+    return min(max(index, 0), len(node.duik_texanim_images) - 1)
+
+def link_file( src, dst ):
+    """Hard links the file, or copies it if the file system does not support links"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def write_blank_file( path, file_format ):
+    """Writes a transparent image"""
+    image = bpy.data.images.new("Bluik blank", 4, 4, alpha=True)
+    image.pixels.foreach_set([0.0] * 4 * 4 * 4)
+    image.filepath_raw = path
+    image.file_format = file_format
+    image.save()
+    bpy.data.images.remove(image)
+
+def get_texanim_file( item ):
+    """The path of the full resolution file of the TexAnim image,
+    None for blank cells, and "" if the image can't be used in a sequence"""
+    image = item.image
+    if image is None:
+        # not loaded yet, use the referenced file
+        if item.filepath == "":
+            return ""
+        return bpy.path.abspath(item.filepath)
+    if image.source == 'GENERATED':
+        return None
+    if image.packed_file is not None or image.source != 'FILE':
+        return ""
+    # With proxies, the image is the downscaled file
+    full_path = image.get("bluik_full_path")
+    if full_path is not None:
+        return bpy.path.abspath(full_path)
+    return image.filepath_from_user()
+
+def bake_texanim( node, frame_start, frame_end ):
+    """Writes the images of the TexAnim as an image sequence (hard links to the original files)
+    and plays it in the node. Returns False if the images can't be used in a sequence"""
+    images = node.duik_texanim_images
+    if len(images) == 0:
+        return False
+
+    # All images must be files with the same extension,
+    # except the blank cells which are written in this format
+    files = []
+    ext = ""
+    for item in images:
+        path = get_texanim_file(item)
+        if path is None:
+            files.append(None)
+            continue
+        if not os.path.isfile(path):
+            return False
+        if ext == "":
+            ext = os.path.splitext(path)[1]
+        elif os.path.splitext(path)[1].lower() != ext.lower():
+            return False
+        files.append(path)
+    if ext == "":
+        ext = ".png"
+    if None in files and not ext.lower() in BLANK_FORMATS:
+        return False
+
+    bake_dir = get_texanim_bake_dir(node)
+    if os.path.isdir(bake_dir):
+        shutil.rmtree(bake_dir)
+    os.makedirs(bake_dir)
+
+    if None in files:
+        blank_file = os.path.join( bake_dir, "blank" + ext )
+        write_blank_file(blank_file, BLANK_FORMATS[ext.lower()])
+        files = [blank_file if path is None else path for path in files]
+
+    # The files are numbered from 1, as frame numbers may be negative
+    first_file = ""
+    for frame in range(frame_start, frame_end + 1):
+        index = get_texanim_index(node, frame)
+        dst = os.path.join( bake_dir, "{:06d}".format(frame - frame_start + 1) + ext )
+        link_file(files[index], dst)
+        if first_file == "":
+            first_file = dst
+
+    sequence = bpy.data.images.load(first_file, check_existing=False)
+    sequence.name = node.duik_texanim_name + ".Baked"
+    sequence.source = 'SEQUENCE'
+    node.image = sequence
+    # File 1 is shown at the first frame
+    node.image_user.frame_start = frame_start
+    node.image_user.frame_duration = frame_end - frame_start + 1
+    node.image_user.frame_offset = 0
+    node.image_user.use_cyclic = False
+    node.image_user.use_auto_refresh = True
+    node.duik_texanim_baked = True
+    return True
+
+def unbake_texanim( node, delete_files=True ):
+    """Restores the TexAnim images"""
+    sequence = node.image
+    node.duik_texanim_baked = False
+    tex_anim.invalidate_applied_index(node)
+    tex_anim.update_image(node, True)
+    if sequence is not None and sequence.users == 0:
+        bpy.data.images.remove(sequence)
+    if delete_files:
+        bake_dir = get_texanim_bake_dir(node)
+        if os.path.isdir(bake_dir):
+            shutil.rmtree(bake_dir)
+
+# Object Selectors
+
+def get_selector_choices( selector ):
+    """Lists the objects shown by each item of the selector.
+    Collections can't be animated: in Collections mode, these are the objects of each child collection"""
+    choices = []
+    for item in selector.objects:
+        target = object_selector.get_item_target(selector, item)
+        if target is None:
+            choices.append(())
+        elif isinstance(target, bpy.types.Collection):
+            choices.append(tuple(target.all_objects))
+        else:
+            choices.append((target,))
+    return choices
+
+def get_choices_objects( choices ):
+    """The objects of all the choices, without duplicates"""
+    objects = []
+    for choice in choices:
+        for obj in choice:
+            if not obj in objects:
+                objects.append(obj)
+    return objects
+
+def get_fcurve( obj, data_path ):
+    anim_data = obj.animation_data
+    if anim_data is None or anim_data.action is None:
+        return None
+    return anim_data.action.fcurves.find(data_path)
+
+def find_keyframe( curve, frame ):
+    """The keyframe of the curve at the frame, or None"""
+    if curve is None:
+        return None
+    for point in curve.keyframe_points:
+        if point.co[0] == frame:
+            return point
+    return None
+
+def key_baked_visibility( obj, data_path, frame ):
+    """Keys the visibility property and records the key on the object, so that unbaking only removes the keys of the bake.
+    The keys the user had set at the same frame are recorded to be restored"""
+    baked_keys = obj.get(BAKED_KEYS_PROP)
+    if baked_keys is None:
+        obj[BAKED_KEYS_PROP] = {}
+        baked_keys = obj[BAKED_KEYS_PROP]
+    curve = get_fcurve(obj, data_path)
+    channel = baked_keys.get(data_path)
+    if channel is None:
+        baked_keys[data_path] = {
+            'created': curve is None,
+            'frames': [],
+            'replaced': {},
+        }
+        channel = baked_keys[data_path]
+    point = find_keyframe(curve, frame)
+    if point is not None and not channel['created']:
+        # ID properties only have string keys
+        channel['replaced'][str(frame)] = point.co[1]
+    obj.keyframe_insert(data_path, frame=frame)
+    frames = list(channel['frames'])
+    frames.append(frame)
+    channel['frames'] = frames
+
+def remove_baked_keys( obj ):
+    """Removes the visibility keys created by the bake, restores the ones set by the user"""
+    baked_keys = obj.get(BAKED_KEYS_PROP)
+    if baked_keys is None:
+        return
+    for data_path, channel in baked_keys.to_dict().items():
+        if channel['created']:
+            dublf.animation.remove_all_keyframes(obj, data_path)
+            continue
+        replaced = channel.get('replaced', {})
+        curve = get_fcurve(obj, data_path)
+        if curve is not None and len(replaced) > 0:
+            for frame, value in replaced.items():
+                point = find_keyframe(curve, int(frame))
+                if point is not None:
+                    point.co[1] = value
+            curve.update()
+        for frame in channel['frames']:
+            if str(frame) in replaced:
+                continue
+            try:
+                obj.keyframe_delete(data_path, frame=frame)
+            except RuntimeError:
+                # the key has been removed since
+                pass
+    del obj[BAKED_KEYS_PROP]
+
+def bake_object_selector( selector, frame_start, frame_end ):
+    """Keys the visibility of the objects of the selector (the objects of the collections in Collections mode)"""
+    curve = object_selector.get_selector_fcurve(selector)
+    choices = get_selector_choices(selector)
+    objects = get_choices_objects(choices)
+    if selector.mode == 'COLLECTIONS':
+        # The keys on the objects switch the choices, all the collections must be visible
+        for item in selector.objects:
+            object_selector.set_object_visible(item.collection, True)
+    previous = {}
+    for frame in range(frame_start, frame_end + 1):
+        index = object_selector.get_frame_index(selector, frame)
+        if index is None:
+            if curve is None:
+                index = selector.current_index
+            else:
+                index = int(curve.evaluate(frame))
+        visible = ()
+        if 0 <= index < len(choices):
+            visible = choices[index]
+        for obj in objects:
+            hidden = not obj in visible
+            if previous.get(obj) == hidden:
+                continue
+            previous[obj] = hidden
+            obj.hide_viewport = hidden
+            obj.hide_render = hidden
+            key_baked_visibility(obj, 'hide_viewport', frame)
+            key_baked_visibility(obj, 'hide_render', frame)
+    selector.baked = True
+
+def unbake_object_selector( selector ):
+    """Removes the visibility keyframes of the bake and lets the selector control the objects again"""
+    for obj in get_choices_objects(get_selector_choices(selector)):
+        remove_baked_keys(obj)
+        if selector.mode == 'COLLECTIONS':
+            # the selector only switches the collections
+            object_selector.set_object_visible(obj, True)
+    selector.baked = False
+    object_selector.update_object_selector(selector, True)
+
+# Measure
+
+def time_handlers( scene, frame_start, frame_end ):
+    """Measures the mean time used by the frame change hooks per frame, in seconds.
+    Plays the first frames of the range like a playback would,
+    the hooks are timed after the animation has been evaluated at each frame"""
+    frame_current = scene.frame_current
+    num_frames = min(TIMING_FRAMES, frame_end - frame_start)
+    duration = 0.0
+    frame_handlers.hooks_suspended = True
+    try:
+        # the caches of the hooks must start at the previous frame
+        scene.frame_set(frame_start)
+        frame_handlers.call_hooks(scene)
+        for frame in range(frame_start + 1, frame_start + num_frames + 1):
+            scene.frame_set(frame)
+            t0 = time.perf_counter()
+            frame_handlers.call_hooks(scene)
+            duration += time.perf_counter() - t0
+    finally:
+        frame_handlers.hooks_suspended = False
+        scene.frame_set(frame_current)
+    if num_frames <= 0:
+        return 0.0
+    return duration / num_frames
+
+# Classes
+
+class BLUIK_OT_bake_for_render( bpy.types.Operator ):
+    """Bakes the TexAnims to image sequences, the Object Selectors to visibility keyframes
+    and the Camera Linkers to constraint influences, so that renders don't depend on the frame change handlers"""
+    bl_idname = "bluik.bake_for_render"
+    bl_label = "Bake for render"
+    bl_options = {'REGISTER','UNDO'}
+
+    texanims: bpy.props.BoolProperty( name="TexAnims", default=True )
+    object_selectors: bpy.props.BoolProperty( name="Object Selectors", default=True )
+    camera_linkers: bpy.props.BoolProperty( name="Camera Linkers", default=True )
+
+    def execute(self, context):
+        scene = context.scene
+        frame_start = scene.frame_start
+        frame_end = scene.frame_end
+        num_frames = frame_end - frame_start + 1
+
+        if self.texanims and not bpy.data.is_saved:
+            self.report({'ERROR'}, "The file must be saved to bake the TexAnims next to it")
+            return {'CANCELLED'}
+
+        handlers_before = time_handlers(scene, frame_start, frame_end)
+        t0 = time.perf_counter()
+
+        num_texanims = 0
+        failed = 0
+        if self.texanims:
+            for node in tex_anim.get_texanim_nodes():
+                if node.duik_texanim_baked:
+                    continue
+                if bake_texanim(node, frame_start, frame_end):
+                    num_texanims += 1
+                else:
+                    failed += 1
+
+        num_selectors = 0
+        if self.object_selectors:
+            for selector in object_selector.get_object_selectors():
+                if selector.baked:
+                    continue
+                bake_object_selector(selector, frame_start, frame_end)
+                num_selectors += 1
+
+        num_linkers = 0
+        if self.camera_linkers:
+            for obj in cam_linker.get_cam_linker_objects(scene):
+                for linker in obj.cam_linkers:
+                    if linker.baked:
+                        continue
+                    if cam_linker.bake_cam_linker(obj, linker, scene):
+                        num_linkers += 1
+
+        bake_time = time.perf_counter() - t0
+        handlers_after = time_handlers(scene, frame_start, frame_end)
+
+        message = "Baked {} TexAnims, {} Object Selectors and {} Camera Linkers in {:.2f} s. Handlers: {:.2f} ms per frame before, {:.2f} ms after ({:.2f} s saved over {} frames)".format(
+            num_texanims,
+            num_selectors,
+            num_linkers,
+            bake_time,
+            handlers_before * 1000,
+            handlers_after * 1000,
+            (handlers_before - handlers_after) * num_frames,
+            num_frames
+        )
+        print("Bluik: " + message)
+        if failed > 0:
+            self.report({'WARNING'}, message + ". {} TexAnims could not be baked (packed, missing or mixed image formats)".format(failed))
+        else:
+            self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+class BLUIK_OT_unbake_for_render( bpy.types.Operator ):
+    """Restores the TexAnims, Object Selectors and Camera Linkers baked for render"""
+    bl_idname = "bluik.unbake_for_render"
+    bl_label = "Unbake"
+    bl_options = {'REGISTER','UNDO'}
+
+    delete_files: bpy.props.BoolProperty(
+        name="Delete image sequences",
+        description="Deletes the baked image sequences",
+        default=True
+        )
+
+    def execute(self, context):
+        num_texanims = 0
+        for node in tex_anim.get_texanim_nodes():
+            if not node.duik_texanim_baked:
+                continue
+            unbake_texanim(node, self.delete_files)
+            num_texanims += 1
+
+        num_selectors = 0
+        for selector in object_selector.get_object_selectors():
+            if not selector.baked:
+                continue
+            unbake_object_selector(selector)
+            num_selectors += 1
+
+        num_linkers = 0
+        for obj in cam_linker.get_cam_linker_objects():
+            for linker in obj.cam_linkers:
+                if not linker.baked:
+                    continue
+                cam_linker.unbake_cam_linker(obj, linker)
+                num_linkers += 1
+
+        self.report({'INFO'}, "Unbaked {} TexAnims, {} Object Selectors and {} Camera Linkers".format(num_texanims, num_selectors, num_linkers))
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
+class BLUIK_PT_render_bake( bpy.types.Panel ):
+    bl_label = "Bluik"
+    bl_idname = "BLUIK_PT_render_bake"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "render"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        row = layout.row(align=True)
+        row.operator("bluik.bake_for_render", icon='RENDER_ANIMATION')
+        row.operator("bluik.unbake_for_render", icon='LOOP_BACK')
+
+classes = (
+    BLUIK_OT_bake_for_render,
+    BLUIK_OT_unbake_for_render,
+    BLUIK_PT_render_bake,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
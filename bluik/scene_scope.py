@@ -0,0 +1,178 @@
+#====================== BEGIN GPL LICENSE BLOCK ======================
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#======================= END GPL LICENSE BLOCK ========================
+
+# <pep8 compliant>
+
+# The data reachable from a scene, so that the frame change handlers
+# only update what the scene being evaluated actually uses
+
+import bpy # pylint: disable=import-error
+from bpy.app.handlers import persistent # pylint: disable=import-error
+
+def get_layer_collections( layer_collection ):
+    """Lists the layer collection and its children, except the excluded ones"""
+    if layer_collection.exclude:
+        return []
+    layer_collections = [layer_collection]
+    for child in layer_collection.children:
+        layer_collections += get_layer_collections(child)
+    return layer_collections
+
+def get_scene_layout( scene ):
+    """The collections used by each view layer of the scene: { (view layer name, collection pointer) }"""
+    layout = set()
+    for view_layer in scene.view_layers:
+        for layer_collection in get_layer_collections(view_layer.layer_collection):
+            layout.add((view_layer.name, layer_collection.collection.as_pointer()))
+    return layout
+
+class SceneScope():
+    """The pointers of the objects, materials and node groups used by the view layers of a scene"""
+
+    def __init__(self, scene):
+        self.scene = scene.as_pointer()
+        self.objects = set()
+        self.node_owners = set()
+        # the instanced collections, and all the collections containing the objects
+        self.collections = set()
+        self.used_collections = set()
+        self.layout = get_scene_layout(scene)
+        for view_layer in scene.view_layers:
+            for layer_collection in get_layer_collections(view_layer.layer_collection):
+                self.used_collections.add(layer_collection.collection.as_pointer())
+                self.add_objects(layer_collection.collection.objects)
+
+    def add_objects(self, objects):
+        """Adds the objects, their materials, and the objects of the collections they instance"""
+        for obj in objects:
+            key = obj.as_pointer()
+            if key in self.objects:
+                continue
+            self.objects.add(key)
+            for slot in obj.material_slots:
+                material = slot.material
+                if material is None:
+                    continue
+                key = material.as_pointer()
+                if key in self.node_owners:
+                    continue
+                self.node_owners.add(key)
+                self.add_node_groups(material.node_tree)
+            if obj.instance_type == 'COLLECTION':
+                self.add_instance_collection(obj.instance_collection)
+
+    def add_instance_collection(self, collection):
+        """Adds the objects of an instanced (or linked) collection, including nested instances"""
+        if collection is None:
+            return
+        key = collection.as_pointer()
+        if key in self.collections:
+            return
+        self.collections.add(key)
+        self.add_used_collection(collection)
+        self.add_objects(collection.all_objects)
+
+    def add_used_collection(self, collection):
+        """Adds the collection and its children, recursively"""
+        self.used_collections.add(collection.as_pointer())
+        for child in collection.children:
+            self.add_used_collection(child)
+
+    def add_node_groups(self, tree):
+        """Adds the node groups used in the tree, recursively"""
+        if tree is None:
+            return
+        for node in tree.nodes:
+            if node.bl_idname != 'ShaderNodeGroup' or node.node_tree is None:
+                continue
+            key = node.node_tree.as_pointer()
+            if key in self.node_owners:
+                continue
+            self.node_owners.add(key)
+            self.add_node_groups(node.node_tree)
+
+    def has_new_node_groups(self, tree):
+        """Checks if the tree uses node groups which are not in the scope"""
+        if tree is None:
+            return False
+        for node in tree.nodes:
+            if node.bl_idname != 'ShaderNodeGroup' or node.node_tree is None:
+                continue
+            if not node.node_tree.as_pointer() in self.node_owners:
+                return True
+        return False
+
+    def is_changed_by(self, update):
+        """Checks if the depsgraph update may change what the scene uses"""
+        data = update.id.original
+        key = data.as_pointer()
+        if isinstance(data, bpy.types.Collection):
+            # objects or child collections added or removed
+            return key in self.used_collections
+        if isinstance(data, bpy.types.Object):
+            # materials or instanced collection changed
+            return update.is_updated_geometry and key in self.objects
+        if isinstance(data, bpy.types.Material):
+            return key in self.node_owners and self.has_new_node_groups(data.node_tree)
+        if isinstance(data, bpy.types.ShaderNodeTree):
+            return key in self.node_owners and self.has_new_node_groups(data)
+        if isinstance(data, bpy.types.Scene):
+            # view layers added or removed, collections excluded
+            return key == self.scene and get_scene_layout(data) != self.layout
+        return False
+
+# { scene pointer: SceneScope }
+scene_scopes = {}
+
+def get_scene_scope( scene ):
+    """Returns the (cached) scope of the scene"""
+    key = scene.as_pointer()
+    scope = scene_scopes.get(key)
+    if scope is None:
+        scope = SceneScope(scene)
+        scene_scopes[key] = scope
+    return scope
+
+@persistent
+def clear_scene_scopes_handler( *args ):
+    """Pointers may have changed after loading a file or undoing"""
+    scene_scopes.clear()
+
+@persistent
+def scene_scope_depsgraph_handler( scene, depsgraph ):
+    """Invalidates the scopes using the collections, objects and materials which have changed"""
+    for update in depsgraph.updates:
+        if len(scene_scopes) == 0:
+            return
+        for key, scope in tuple(scene_scopes.items()):
+            if scope.is_changed_by(update):
+                del scene_scopes[key]
+
+def register():
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if not clear_scene_scopes_handler in handlers:
+            handlers.append(clear_scene_scopes_handler)
+    if not scene_scope_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(scene_scope_depsgraph_handler)
+
+def unregister():
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if clear_scene_scopes_handler in handlers:
+            handlers.remove(clear_scene_scopes_handler)
+    if scene_scope_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(scene_scope_depsgraph_handler)
+    scene_scopes.clear()
@@ -23,13 +23,27 @@ import bpy # pylint: disable=import-error
 import bpy.utils.previews # pylint: disable=import-error
 from bpy.app.handlers import persistent # pylint: disable=import-error
 import re
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from . import dublf
+from . import frame_tables
+from . import scene_scope
+from . import preferences
 
 # ===================================================
 # methods to update images on frame change and update
 # ===================================================
 
-def update_image(node):
+# The last image index applied to each TexAnim node, by node pointer
+texanim_applied_indices = {}
+# Number of image assignments done and skipped by update_image
+texanim_stats = {
+    'writes': 0,
+    'skipped': 0,
+}
+
+def update_image(node, force=False):
     numImages = len(node.duik_texanim_images)
     if numImages > 0:
         index = node.duik_texanim_current_index
@@ -41,25 +55,449 @@ def update_image(node):
             index = numImages - 1
             node.duik_texanim_current_index = index
             return
-        node.image = node.duik_texanim_images[index].image
+        apply_image(node, index, force)
+
+def apply_image(node, index, force=False):
+    """Sets the image at the (valid) index in the Texture Image node"""
+    # Assigning the image tags the material for a shader update,
+    # don't do it if the image has not changed (holds)
+    key = node.as_pointer()
+    if not force and texanim_applied_indices.get(key) == index:
+        texanim_stats['skipped'] += 1
+        return
+    item = node.duik_texanim_images[index]
+    image = item.image
+    if image is None:
+        image = resolve_image(item)
+    if image is not None:
+        # was the image preloaded?
+        if image.has_data:
+            texanim_cache_stats['hits'] += 1
+        else:
+            texanim_cache_stats['misses'] += 1
+    node.image = image
+    texanim_applied_indices[key] = index
+    texanim_stats['writes'] += 1
+
+def is_reference( item ):
+    """Checks if the image of the item is a reference to a file which has not been loaded yet"""
+    return item.image is None and item.filepath != ""
+
+def resolve_image( item ):
+    """Loads the image of a reference, returns the image"""
+    if not is_reference(item):
+        return item.image
+    path = bpy.path.abspath(item.filepath)
+    if not os.path.isfile(path):
+        return None
+    image = bpy.data.images.load(path, check_existing=True)
+    image.name = item.name
+    item.image = image
+    return image
+
+def resolve_references( node ):
+    """Loads all the images referenced by the TexAnim, returns the number of loaded images"""
+    num_resolved = 0
+    for item in node.duik_texanim_images:
+        if not is_reference(item):
+            continue
+        if resolve_image(item) is not None:
+            num_resolved += 1
+    return num_resolved
+
+def invalidate_applied_index( node ):
+    """Forces the next update of the node to re-apply its image"""
+    texanim_applied_indices.pop(node.as_pointer(), None)
+    invalidate_frame_table(node)
+
+def reset_texanim_stats():
+    for key in texanim_stats:
+        texanim_stats[key] = 0
+    for key in ('loaded', 'evicted', 'hits', 'misses'):
+        texanim_cache_stats[key] = 0
 
 def update_current_image( node, context ):
     """Changes the image used in the Texture Image node"""
-    update_image(node)
+    if node.duik_texanim_baked:
+        return
+    update_image(node, True)
 
-@persistent
 def update_image_handler( scene ):
     """Updates all TexAnim_images, as the update function does not work on playback"""
-    # get all texanims in the scene
+    frame = scene.frame_current
+    prefs = preferences.get_preferences()
+    global texanim_preload_budget
+    cache_images = prefs.texanim_cache_enabled
+    texanim_preload_budget = prefs.texanim_preload_decodes
+    keep = set()
+    # only visit the registered texanims used by this scene
+    for node in get_texanim_nodes(scene):
+        # baked nodes play an image sequence
+        if node.duik_texanim_baked:
+            continue
+        index = get_frame_index(node, frame)
+        if index is None:
+            update_image(node)
+        else:
+            apply_image(node, index)
+        if cache_images:
+            keep.update( preload_images(node, frame, prefs.texanim_preload_before, prefs.texanim_preload_after) )
+    if cache_images:
+        evict_images(prefs.texanim_cache_size * 1024 * 1024, keep)
+
+# ===================================================
+# Frame to image index tables
+# ===================================================
+
+# The TexAnim curves compiled to frame -> image index tables, by node pointer
+# { node pointer: (action pointer, (first frame, array('H') of indices) or None if the curve can't be compiled) }
+texanim_frame_tables = {}
+
+def get_texanim_fcurve( node ):
+    """Returns the F-Curve animating the current index of the TexAnim, if it is directly keyed in an action"""
+    anim_data = node.id_data.animation_data
+    if anim_data is None or anim_data.action is None:
+        return None
+    # NLA strips and drivers change the evaluated value
+    if len(anim_data.nla_tracks) > 0:
+        return None
+    data_path = 'nodes[\"' + node.name + '\"].duik_texanim_current_index'
+    if anim_data.drivers.find(data_path) is not None:
+        return None
+    return anim_data.action.fcurves.find(data_path)
+
+def compile_frame_table( node ):
+    """Compiles the TexAnim curve to a frame -> image index table.
+    Returns None if the curve is not a simple constant curve"""
+    curve = get_texanim_fcurve(node)
+    return frame_tables.compile_fcurve(curve, 0, len(node.duik_texanim_images) - 1)
+
+def get_frame_index( node, frame ):
+    """Gets the image index at the given frame from the compiled table.
+    Returns None if there is no table for this node"""
+    if len(node.duik_texanim_images) == 0:
+        return None
+    key = node.as_pointer()
+    action_key = frame_tables.get_action_key(node.id_data)
+    entry = texanim_frame_tables.get(key)
+    # compile again when another action has been assigned
+    if entry is None or entry[0] != action_key:
+        entry = (action_key, compile_frame_table(node))
+        texanim_frame_tables[key] = entry
+    table = entry[1]
+    if table is None:
+        return None
+    return frame_tables.lookup(table, frame)
+
+def invalidate_frame_table( node ):
+    """Forces the TexAnim curve to be compiled again"""
+    texanim_frame_tables.pop(node.as_pointer(), None)
+
+# ===================================================
+# Image cache
+# ===================================================
+
+# The TexAnim images loaded by the cache, least recently used first
+# { image pointer: [ image, memory size in bytes ] }
+texanim_image_cache = OrderedDict()
+texanim_cache_stats = {
+    'memory': 0,
+    'loaded': 0,
+    'evicted': 0,
+    'hits': 0,
+    'misses': 0,
+}
+# The number of upcoming images which can still be decoded during the current frame change:
+# Blender decodes the images on the main thread
+texanim_preload_budget = 0
+
+def get_image_memory( image ):
+    """Estimates the memory used by the pixels of the image, in bytes"""
+    w, h = image.size
+    bytes_per_channel = 4 if image.is_float else 1
+    return w * h * image.channels * bytes_per_channel
+
+def is_cacheable( image ):
+    """Only images which can be read again from their file can be freed"""
+    return image is not None and image.source == 'FILE' and not image.is_dirty
+
+def cache_image( image, load=True ):
+    """Marks the image as recently used, and loads its pixels if needed"""
+    if not is_cacheable(image):
+        return
+    key = image.as_pointer()
+    entry = texanim_image_cache.get(key)
+    if entry is not None:
+        texanim_image_cache.move_to_end(key)
+        return
+    if load and not image.has_data:
+        # acquiring the buffer reads the file
+        image.update()
+        texanim_cache_stats['loaded'] += 1
+    size = get_image_memory(image)
+    texanim_image_cache[key] = [image, size]
+    texanim_cache_stats['memory'] += size
+
+def preload_images( node, frame, before, after ):
+    """Loads the images displayed around the frame, within the decoding budget of the frame change.
+    Returns the set of the corresponding image pointers"""
+    global texanim_preload_budget
+    images = node.duik_texanim_images
+    indices = []
+    if get_frame_index(node, frame) is None:
+        # Without a frame table we only know the current image
+        index = node.duik_texanim_current_index
+        if 0 <= index < len(images):
+            indices.append(index)
+    else:
+        indices.append(get_frame_index(node, frame))
+        for f in range(frame - before, frame + after + 1):
+            index = get_frame_index(node, f)
+            if index not in indices:
+                indices.append(index)
+    keys = set()
+    if len(indices) == 0:
+        return keys
+    current = indices[0]
+    for index in indices:
+        image = images[index].image
+        if image is None:
+            continue
+        keys.add(image.as_pointer())
+        # Load the current image now, and the others
+        # only once their file has been read in the background
+        if index == current or image.has_data:
+            cache_image(image)
+            continue
+        if prefetch_image_file(image) and texanim_preload_budget > 0:
+            texanim_preload_budget -= 1
+            cache_image(image)
+    return keys
+
+def evict_images( budget, keep=() ):
+    """Frees the least recently used images until the cache fits in the budget (in bytes)"""
+    for key in tuple(texanim_image_cache.keys()):
+        if texanim_cache_stats['memory'] <= budget:
+            break
+        if key in keep:
+            continue
+        image, size = texanim_image_cache.pop(key)
+        texanim_cache_stats['memory'] -= size
+        try:
+            image.buffers_free()
+        except ReferenceError:
+            # the image has been removed
+            continue
+        texanim_cache_stats['evicted'] += 1
+
+def clear_image_cache( free=False ):
+    """Forgets (and optionally frees) all the cached images"""
+    if free:
+        evict_images(-1)
+    texanim_image_cache.clear()
+    texanim_cache_stats['memory'] = 0
+
+# ===================================================
+# Background reading of the image files
+# ===================================================
+
+# The image files read (or being read) by the thread pool, oldest first
+# { file path: future }
+texanim_prefetched_files = OrderedDict()
+texanim_prefetch_pool = None
+texanim_prefetch_threads = 0
+# The number of paths to remember
+PREFETCH_HISTORY = 4096
+PREFETCH_CHUNK_SIZE = 1048576
+
+def read_file( path ):
+    """Reads the whole file, so that it is in the system cache when Blender opens it.
+    Returns the number of bytes read"""
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(PREFETCH_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+    return size
+
+def get_prefetch_pool():
+    """Gets the thread pool, (re)creating it when the number of threads has changed.
+    Returns None if background reading is disabled"""
+    global texanim_prefetch_pool
+    global texanim_prefetch_threads
+    num_threads = preferences.get_preferences().texanim_prefetch_threads
+    if num_threads == 0:
+        stop_prefetch()
+        return None
+    if texanim_prefetch_pool is not None and texanim_prefetch_threads != num_threads:
+        stop_prefetch()
+    if texanim_prefetch_pool is None:
+        texanim_prefetch_pool = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="Bluik TexAnim")
+        texanim_prefetch_threads = num_threads
+    return texanim_prefetch_pool
+
+def stop_prefetch():
+    """Shuts the thread pool down, without waiting for the pending reads"""
+    global texanim_prefetch_pool
+    if texanim_prefetch_pool is not None:
+        texanim_prefetch_pool.shutdown(wait=False)
+        texanim_prefetch_pool = None
+    texanim_prefetched_files.clear()
+
+def prefetch_image_file( image ):
+    """Reads the image file in the background.
+    Returns True when the file is ready to be loaded by Blender without waiting for the disk"""
+    if image.packed_file is not None:
+        return True
+    pool = get_prefetch_pool()
+    if pool is None:
+        return True
+    path = image.filepath_from_user()
+    future = texanim_prefetched_files.get(path)
+    if future is None:
+        if not os.path.isfile(path):
+            return True
+        texanim_prefetched_files[path] = pool.submit(read_file, path)
+        if len(texanim_prefetched_files) > PREFETCH_HISTORY:
+            texanim_prefetched_files.popitem(last=False)
+        return False
+    return future.done()
+
+# ===================================================
+# Registry of the TexAnim nodes
+# ===================================================
+
+# The materials and node groups containing TexAnim nodes.
+# { ID pointer: [ ID, set of node names, number of nodes ] }
+texanim_registry = {}
+# Set when the registry has to be rebuilt from bpy.data (load, undo)
+texanim_registry_dirty = True
+
+def is_texanim( node ):
+    """Checks if the node is a Texture Image node with TexAnim images"""
+    return node.bl_idname == 'ShaderNodeTexImage' and len(node.duik_texanim_images) > 0
+
+def get_node_tree( owner ):
+    """Returns the node tree of a material, or the node group itself"""
+    if isinstance(owner, bpy.types.Material):
+        return owner.node_tree
+    return owner
+
+def get_tree_owner( tree ):
+    """Returns the ID owning the node tree: the material for embedded trees, or the node group itself"""
+    if not tree.is_embedded_data:
+        return tree
+    for material in bpy.data.materials:
+        if material.node_tree == tree:
+            return material
+    return None
+
+def register_texanim_owner( owner ):
+    """(Re)scans a material or node group and updates its entry in the registry"""
+    key = owner.as_pointer()
+    tree = get_node_tree(owner)
+    if tree is None:
+        texanim_registry.pop(key, None)
+        return
+    names = set()
+    for node in tree.nodes:
+        if is_texanim(node):
+            names.add(node.name)
+    if len(names) > 0:
+        texanim_registry[key] = [owner, names, len(tree.nodes)]
+    else:
+        texanim_registry.pop(key, None)
+
+def register_texanim_node( node ):
+    """Adds (or removes) the node to the registry, after its TexAnim images have changed"""
+    owner = get_tree_owner(node.id_data)
+    if owner is not None:
+        register_texanim_owner(owner)
+
+def rebuild_texanim_registry():
+    """Scans all materials and node groups to rebuild the registry"""
+    global texanim_registry_dirty
+    texanim_registry.clear()
+    texanim_applied_indices.clear()
+    texanim_frame_tables.clear()
+    # the image references may not be valid anymore
+    clear_image_cache()
     for material in bpy.data.materials:
-        if material.node_tree is not None:
-            for node in material.node_tree.nodes:
-                if node.bl_idname == 'ShaderNodeTexImage':
-                    update_image(node)
+        register_texanim_owner(material)
     for nodeGroup in bpy.data.node_groups:
-        for node in nodeGroup.nodes:
-            if node.bl_idname == 'ShaderNodeTexImage':
-                update_image(node)
+        if nodeGroup.bl_idname == 'ShaderNodeTree':
+            register_texanim_owner(nodeGroup)
+    texanim_registry_dirty = False
+
+def get_texanim_nodes( scene=None ):
+    """Returns the list of all TexAnim nodes from the registry,
+    or only the ones used by the scene"""
+    if texanim_registry_dirty:
+        rebuild_texanim_registry()
+    scope = None
+    if scene is not None:
+        scope = scene_scope.get_scene_scope(scene)
+    nodes = []
+    for key, entry in tuple(texanim_registry.items()):
+        if scope is not None and not key in scope.node_owners:
+            continue
+        owner, names, num_nodes = entry
+        try:
+            tree = get_node_tree(owner)
+        except ReferenceError:
+            # The material or node group has been removed
+            del texanim_registry[key]
+            continue
+        if tree is None:
+            del texanim_registry[key]
+            continue
+        found = []
+        for name in names:
+            node = tree.nodes.get(name)
+            if node is None:
+                break
+            found.append(node)
+        # A node has been renamed or removed, rescan
+        if len(found) != len(names):
+            register_texanim_owner(owner)
+            entry = texanim_registry.get(key)
+            if entry is None:
+                continue
+            found = [tree.nodes[name] for name in entry[1]]
+        nodes.extend(found)
+    return nodes
+
+@persistent
+def texanim_registry_dirty_handler( *args ):
+    """Flags the registry to be rebuilt, after loading a file or undoing"""
+    global texanim_registry_dirty
+    texanim_registry_dirty = True
+
+@persistent
+def texanim_depsgraph_handler( scene, depsgraph ):
+    """Updates the registry for new or modified materials and node groups,
+    and invalidates the frame tables of the actions which may have changed"""
+    frame_tables.remove_action_tables(texanim_frame_tables, frame_tables.get_updated_actions(depsgraph))
+
+    if texanim_registry_dirty:
+        return
+    for update in depsgraph.updates:
+        owner = update.id.original
+        if isinstance(owner, bpy.types.ShaderNodeTree):
+            if owner.is_embedded_data:
+                # The material is updated too
+                continue
+        elif not isinstance(owner, bpy.types.Material):
+            continue
+        # Only rescan when nodes may have been added or removed
+        entry = texanim_registry.get(owner.as_pointer())
+        if entry is not None:
+            tree = get_node_tree(owner)
+            if tree is not None and len(tree.nodes) == entry[2]:
+                continue
+        register_texanim_owner(owner)
 
 # UTILS
 
@@ -106,6 +544,8 @@ class DUIK_TexAnimImage( bpy.types.PropertyGroup ):
     """One Image in the TexAnim"""
     image: bpy.props.PointerProperty( type = bpy.types.Image )
     name: bpy.props.StringProperty( name="Image", default="Image")
+    # A reference to the file, loaded when the image is first displayed
+    filepath: bpy.props.StringProperty( subtype='FILE_PATH' )
 
 class DUIK_OT_new_texanim_images( bpy.types.Operator ):
     """Adds a new image to the texanim"""
@@ -136,6 +576,9 @@ class DUIK_OT_new_texanim_images( bpy.types.Operator ):
             texAnimImage = node.duik_texanim_images.add()
             texAnimImage.image = image
             texAnimImage.name = name
+
+        invalidate_applied_index(node)
+        register_texanim_node(node)
         
         dublf.ui.redraw()
 
@@ -173,6 +616,8 @@ class DUIK_OT_remove_texanim_image( bpy.types.Operator ):
 
         # remove this image
         node.duik_texanim_images.remove(current_index)
+        invalidate_applied_index(node)
+        register_texanim_node(node)
         return {'FINISHED'}
 
 class DUIK_OT_texanim_image_move( bpy.types.Operator ):
@@ -209,6 +654,7 @@ class DUIK_OT_texanim_image_move( bpy.types.Operator ):
         dublf.animation.swap_animated_index(tree, 'nodes[\"' + node.name + '\"].duik_texanim_current_index', current_index, new_index)
 
         images.move(current_index, new_index)
+        invalidate_applied_index(node)
         node.duik_texanim_current_index = new_index
 
         return {'FINISHED'}
@@ -294,6 +740,55 @@ class DUIK_OT_texanim_unlink_control( bpy.types.Operator ):
 
         return {'FINISHED'}
 
+class DUIK_OT_texanim_reset_stats( bpy.types.Operator ):
+    """Resets the TexAnim playback statistics"""
+    bl_idname = "texanim.reset_stats"
+    bl_label = "Reset statistics"
+    bl_options = {'REGISTER'}
+
+    def execute( self, context):
+        reset_texanim_stats()
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
+class DUIK_OT_texanim_free_image_cache( bpy.types.Operator ):
+    """Frees the memory used by all the images loaded by the TexAnim cache"""
+    bl_idname = "texanim.free_image_cache"
+    bl_label = "Free image cache"
+    bl_options = {'REGISTER'}
+
+    def execute( self, context):
+        clear_image_cache(True)
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
+class DUIK_OT_texanim_resolve_references( bpy.types.Operator ):
+    """Loads the images of the TexAnims imported as references only"""
+    bl_idname = "texanim.resolve_references"
+    bl_label = "Load referenced images"
+    bl_options = {'REGISTER','UNDO'}
+
+    all_texanims: bpy.props.BoolProperty(
+        name="All TexAnims",
+        description="Loads the images of all the TexAnims, not only the active one",
+        default=False
+        )
+
+    def execute( self, context):
+        if self.all_texanims:
+            nodes = get_texanim_nodes()
+        else:
+            node = context.active_node
+            if node is None or node.bl_idname != 'ShaderNodeTexImage':
+                return {'CANCELLED'}
+            nodes = [node]
+        num_resolved = 0
+        for node in nodes:
+            num_resolved += resolve_references(node)
+        self.report({'INFO'}, "Loaded {} referenced images".format(num_resolved))
+        dublf.ui.redraw()
+        return {'FINISHED'}
+
 class DUIK_UL_texanim( bpy.types.UIList ):
     """The list of images in the UI"""
     bl_idname = "DUIK_UL_texanim"
@@ -301,7 +796,10 @@ class DUIK_UL_texanim( bpy.types.UIList ):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         split = layout.split(factor=0.2)
         split.label(text=str(index))
-        split.prop(item, "name", text="", emboss=False, icon = 'FILE_IMAGE')
+        icon = 'FILE_IMAGE'
+        if is_reference(item):
+            icon = 'LIBRARY_DATA_INDIRECT'
+        split.prop(item, "name", text="", emboss=False, icon = icon)
 
 class DUIK_UL_linked_texanim( bpy.types.UIList ):
     """The list of linked texanims on an object"""
@@ -356,12 +854,44 @@ class DUIK_PT_texanim_ui( bpy.types.Panel ):
 
         layout.prop( node, 'duik_texanim_current_index', text = "Current Image" )
 
+        num_references = len([item for item in node.duik_texanim_images if is_reference(item)])
+        if num_references > 0:
+            row = layout.row(align=True)
+            row.label(text="{} images not loaded yet".format(num_references))
+            row.operator("texanim.resolve_references", icon='FILE_REFRESH', text="Load").all_texanims = False
+            row.operator("texanim.resolve_references", text="All").all_texanims = True
+
         layout.separator()
 
         row = layout.split(factor=.9, align=True)
         row.operator( "texanim.link_control" )
         row.operator( "texanim.unlink_control", icon='X', text='' )
 
+class DUIK_PT_texanim_stats( bpy.types.Panel ):
+    """Statistics about the image updates during playback"""
+    bl_space_type = 'NODE_EDITOR'
+    bl_region_type = 'UI'
+    bl_label = "Statistics"
+    bl_idname = "DUIK_PT_texanim_stats"
+    bl_parent_id = "DUIK_PT_texanim_ui"
+    bl_category = 'Item'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw( self, context ):
+        layout = self.layout
+        col = layout.column(align=True)
+        col.label( text = "Images assigned: " + str(texanim_stats['writes']) )
+        col.label( text = "Unchanged images skipped: " + str(texanim_stats['skipped']) )
+        col = layout.column(align=True)
+        col.label( text = "Cached images: " + str(len(texanim_image_cache)) + " ({:.1f} MB)".format(texanim_cache_stats['memory'] / 1048576) )
+        col.label( text = "Images loaded: " + str(texanim_cache_stats['loaded']) )
+        col.label( text = "Images freed: " + str(texanim_cache_stats['evicted']) )
+        col = layout.column(align=True)
+        col.label( text = "Preloaded images shown (hits): " + str(texanim_cache_stats['hits']) )
+        col.label( text = "Images loaded on display (misses): " + str(texanim_cache_stats['misses']) )
+        layout.operator( "texanim.free_image_cache", icon='TRASH' )
+        layout.operator( "texanim.reset_stats", icon='LOOP_BACK' )
+
 class DUIK_PT_texanim_control( bpy.types.Panel ):
     """The list as a control in the 3D View > UI > Item panel"""
     bl_space_type = 'VIEW_3D'
@@ -437,9 +967,13 @@ classes = (
     DUIK_OT_texanim_image_move,
     DUIK_OT_texanim_link_control,
     DUIK_OT_texanim_unlink_control,
+    DUIK_OT_texanim_reset_stats,
+    DUIK_OT_texanim_free_image_cache,
+    DUIK_OT_texanim_resolve_references,
     DUIK_UL_texanim,
     DUIK_UL_linked_texanim,
     DUIK_PT_texanim_ui,
+    DUIK_PT_texanim_stats,
     DUIK_PT_texanim_control,
     DUIK_PT_texanim_object_settings,
     DUIK_PT_texanim_bone_settings,
@@ -457,6 +991,8 @@ def register():
         bpy.types.ShaderNodeTexImage.duik_texanim_current_index = bpy.props.IntProperty( update=update_current_image,  options={'ANIMATABLE','LIBRARY_EDITABLE'} )
     if not hasattr( bpy.types.ShaderNodeTexImage, 'duik_texanim_name' ):
         bpy.types.ShaderNodeTexImage.duik_texanim_name = bpy.props.StringProperty( default="Name" )
+    if not hasattr( bpy.types.ShaderNodeTexImage, 'duik_texanim_baked' ):
+        bpy.types.ShaderNodeTexImage.duik_texanim_baked = bpy.props.BoolProperty( default=False, options={'LIBRARY_EDITABLE'} )
 
     # Add controls on pose bones and objects
     if not hasattr( bpy.types.Object, 'duik_linked_texanims' ):
@@ -468,16 +1004,27 @@ def register():
     if not hasattr( bpy.types.PoseBone, 'duik_linked_texanims_current' ):
         bpy.types.PoseBone.duik_linked_texanims_current = bpy.props.IntProperty( )
 
-    # Add handler
-    dublf.handlers.frame_change_post_append( update_image_handler )
+    # Add handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if not texanim_registry_dirty_handler in handlers:
+            handlers.append(texanim_registry_dirty_handler)
+    if not texanim_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(texanim_depsgraph_handler)
 
 def unregister():
-    # Remove handler
-    dublf.handlers.frame_change_post_remove( update_image_handler )
+    # Remove handlers
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if texanim_registry_dirty_handler in handlers:
+            handlers.remove(texanim_registry_dirty_handler)
+    if texanim_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(texanim_depsgraph_handler)
+    texanim_registry.clear()
+    stop_prefetch()
 
     del bpy.types.ShaderNodeTexImage.duik_texanim_images
     del bpy.types.ShaderNodeTexImage.duik_texanim_current_index
     del bpy.types.ShaderNodeTexImage.duik_texanim_name
+    del bpy.types.ShaderNodeTexImage.duik_texanim_baked
     del bpy.types.Object.duik_linked_texanims
     del bpy.types.Object.duik_linked_texanims_current
     del bpy.types.PoseBone.duik_linked_texanims
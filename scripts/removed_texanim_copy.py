@@ -82,6 +82,9 @@ class DUIK_OT_texanim_move_control( bpy.types.Operator ):
 
         # Remove them
         node.duik_texanim_images.clear()
+        # The registry can't see that the images of an existing node have changed
+        invalidate_applied_index(node)
+        register_texanim_node(node)
 
         # Set the link
         if isinstance(obj, bpy.types.PoseBone):
@@ -159,6 +162,8 @@ class DUIK_OT_texanim_remove_control( bpy.types.Operator ):
             new_image = node.duik_texanim_images.add()
             new_image.image = image.image
             new_image.name = image.name
+        invalidate_applied_index(node)
+        register_texanim_node(node)
 
         # Remove Link
         node.duik_texanim_moved_to.obj = None